@@ -4,14 +4,20 @@ from bpy.props import (BoolProperty,
                        EnumProperty,
                        IntProperty,
                        PointerProperty,
+                       CollectionProperty,
                        )
-from bpy_extras.io_utils import ExportHelper
+from bpy_extras.io_utils import ExportHelper, ImportHelper
 from bpy.app.handlers import persistent
-from bpy.types import PropertyGroup, Panel, Scene, Operator
-from btypes.big_endian import *
-from enum import Enum
-import threading
-import bmesh
+from bpy.types import PropertyGroup, Panel, Operator, OperatorFileListElement
+from mathutils import Matrix
+from colcodec import *
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, wait
+import multiprocessing
+import time
+import hashlib
+import os
 import bpy
 import random
 
@@ -22,7 +28,6 @@ bl_info = {
     "blender": (2, 80, 0),
     "location": "File > Export > Collision (.col)",
     "description": "This script allows you do export col files directly from blender. Based on Blank's obj2col",
-    "warning": "Runs update function every 0.2 seconds",
     "category": "Import-Export"
 }
 
@@ -52,158 +57,465 @@ def cleanResources():
             bpy.data.images.remove(block)
 
 
-class Header(Struct):
-    vertexCount = uint32
-    vertexOffset = uint32
-    groupCount = uint32
-    groupOffset = uint32
+def exportMatrix(scale):  # blender space -> col space, make sure y is up
+    return Matrix(((scale, 0, 0, 0),
+                   (0, 0, scale, 0),
+                   (0, -scale, 0, 0),
+                   (0, 0, 0, 1)))
 
 
-class vertex(Struct):
-    x = float32
-    y = float32
-    z = float32
+def collisionAttributeTable(obj):  # (colType, terrainType, unknown, colParameter) per material slot
+    table = []
+    for slot in obj.material_slots:
+        if slot.material is None:
+            table.append((0, 0, 0, None))
+            continue
+        mat = slot.material.colEditor
+        colParameter = mat.colParameterField if mat.hasColParameterField else None
+        table.append((mat.colType, mat.terrainType, mat.UnknownField, colParameter))
+    return table or [(0, 0, 0, None)]
+
+
+FACE_ATTRIBUTES = ("col_type", "terrain_type", "unknown", "col_parameter")  # INT face attributes, col_parameter -1 for none
+HAS_FACE_ATTRIBUTES = bpy.app.version >= (3, 0, 0)  # the FACE attribute domain, older versions only import materials
+
+
+def readFaceAttributes(mesh):  # -> (colTypes, terrainTypes, unknowns, colParameters) per face, None without attributes
+    if getattr(mesh, "attributes", None) is None:  # before 2.91
+        return None
+    values = []
+    for name in FACE_ATTRIBUTES:
+        attribute = mesh.attributes.get(name)
+        if attribute is None or attribute.domain != "FACE" or attribute.data_type != "INT":
+            return None
+        data = array("i", bytes(4*len(mesh.polygons)))
+        attribute.data.foreach_get("value", data)
+        values.append(data)
+    return values
+
+
+def writeFaceAttributes(mesh, values):  # (colTypes, terrainTypes, unknowns, colParameters) per face
+    for name, data in zip(FACE_ATTRIBUTES, values):
+        attribute = mesh.attributes.get(name)
+        if attribute is not None and (attribute.domain != "FACE" or attribute.data_type != "INT"):
+            mesh.attributes.remove(attribute)
+            attribute = None
+        if attribute is None:
+            attribute = mesh.attributes.new(name, "INT", "FACE")
+        attribute.data.foreach_set("value", data)
+
+
+def removeFaceAttributes(mesh):
+    for name in FACE_ATTRIBUTES:
+        attribute = mesh.attributes.get(name)
+        if attribute is not None:
+            mesh.attributes.remove(attribute)
+
+
+def slotFaceValues(obj):  # face attribute values of a mesh object from its material slots
+    polygons = obj.data.polygons
+    materialIndices = array("i", bytes(4*len(polygons)))
+    polygons.foreach_get("material_index", materialIndices)
+    table = collisionAttributeTable(obj)
+    slotCount = max(materialIndices) + 1 if len(materialIndices) > 0 else 0
+    if slotCount > len(table):  # out of range faces use the last slot
+        table.extend([table[-1]]*(slotCount - len(table)))
+    return [array("i", map(column.__getitem__, materialIndices)) for column in
+            zip(*[(colType, terrainType, unknown, -1 if colParameter is None else colParameter)
+                  for colType, terrainType, unknown, colParameter in table])]
+
+
+def objectHash(obj, depsgraph, matrix):  # hash of the evaluated geometry, transform and collision values of an object
+    mesh = obj.evaluated_get(depsgraph).data
+    digest = hashlib.sha1()
+    for items, attribute, typecode, size in ((mesh.vertices, "co", "f", 3),
+                                             (mesh.loops, "vertex_index", "i", 1),
+                                             (mesh.polygons, "loop_start", "i", 1),
+                                             (mesh.polygons, "material_index", "i", 1)):
+        values = array(typecode, bytes(4*size*len(items)))
+        items.foreach_get(attribute, values)
+        digest.update(values)
+    values = readFaceAttributes(mesh)
+    if values is not None:
+        for data in values:
+            digest.update(data)
+    digest.update(repr([tuple(row) for row in matrix @ obj.matrix_world]).encode())
+    digest.update(repr(collisionAttributeTable(obj)).encode())
+    return digest.hexdigest()
+
+
+def extractObject(obj, depsgraph, matrix, profile=NULL_PROFILE):  # evaluated, triangulated mesh of an object -> CollisionModel
+    with profile.phase("evaluate", objects=1):
+        evaluated = obj.evaluated_get(depsgraph)
+        mesh = evaluated.to_mesh()
+    try:
+        with profile.phase("triangulate") as phase:
+            mesh.transform(matrix @ obj.matrix_world)
+            mesh.calc_loop_triangles()
+            phase.count(vertices=len(mesh.vertices), triangles=len(mesh.loop_triangles))
+
+        with profile.phase("read mesh"):
+            model = CollisionModel()
+            model.vertices = array("f", bytes(12*len(mesh.vertices)))
+            mesh.vertices.foreach_get("co", model.vertices)
+
+            triangleCount = len(mesh.loop_triangles)
+            vertexIndices = array("i", bytes(12*triangleCount))
+            mesh.loop_triangles.foreach_get("vertices", vertexIndices)
+            materialIndices = array("i", bytes(4*triangleCount))
+            mesh.loop_triangles.foreach_get("material_index", materialIndices)
+            values = readFaceAttributes(mesh)
+            if values is not None:
+                polygonIndices = array("i", bytes(4*triangleCount))
+                mesh.loop_triangles.foreach_get("polygon_index", polygonIndices)
+    finally:
+        evaluated.to_mesh_clear()
+
+    with profile.phase("collision values", materials=len(obj.material_slots)):
+        model.vertexIndices = array("I", vertexIndices)  # the merged model can exceed uint16 before welding
+        if values is None:
+            mapCollisionValues(model, collisionAttributeTable(obj), materialIndices)
+        else:  # face attributes win over materials
+            try:
+                mapFaceAttributes(model, values, polygonIndices)
+            except OverflowError:
+                raise ValueError("%s: collision attribute out of range" % obj.name)
+    return model
+
+
+def mapFaceAttributes(model, values, polygonIndices):  # fill the attribute arrays of model from per face values
+    colTypes, terrainTypes, unknowns, colParameters = (gather(data, polygonIndices) for data in values)
+    model.colTypes = array("H", colTypes)
+    model.terrainTypes = array("B", terrainTypes)
+    model.unknowns = array("B", unknowns)
+    model.colParameters = array("H", [colParameter if colParameter >= 0 else 0 for colParameter in colParameters])
+    model.hasColParameters = array("B", [colParameter >= 0 for colParameter in colParameters])
+
+
+def mapCollisionValues(model, table, materialIndices):  # fill the attribute arrays of model from per slot values
+
+    slotCount = max(materialIndices) + 1 if len(materialIndices) > 0 else 0
+    if slotCount > len(table):  # out of range faces use the last slot
+        table.extend([table[-1]]*(slotCount - len(table)))
+    colTypes, terrainTypes, unknowns, colParameters = zip(*table)
+    hasColParameters = tuple(colParameter is not None for colParameter in colParameters)
+    colParameters = tuple(colParameter or 0 for colParameter in colParameters)
+    model.colTypes = array("H", map(colTypes.__getitem__, materialIndices))
+    model.terrainTypes = array("B", map(terrainTypes.__getitem__, materialIndices))
+    model.unknowns = array("B", map(unknowns.__getitem__, materialIndices))
+    model.colParameters = array("H", map(colParameters.__getitem__, materialIndices))
+    model.hasColParameters = array("B", map(hasColParameters.__getitem__, materialIndices))
+
+
+def importMatrix():  # col space -> blender space, make sure z is up
+    return Matrix(((1, 0, 0, 0),
+                   (0, 0, -1, 0),
+                   (0, 1, 0, 0),
+                   (0, 0, 0, 1)))
+
+
+def collisionMaterial(colType, terrainType, unknown, colParameter):  # new material carrying collision values
+    MaterialName = str(colType) + "," + str(terrainType) + \
+        "," + str(unknown) + "," + str(colParameter)
+    mat = bpy.data.materials.new(name=MaterialName)
+
+    random.seed(hash(MaterialName))  # Not actually random
+    Red = random.random()
+    Green = random.random()
+    Blue = random.random()
+    mat.diffuse_color = (Red, Green, Blue, 1.0)
+
+    mat.colEditor.colType = colType  # Set collision values
+    mat.colEditor.terrainType = terrainType
+    mat.colEditor.UnknownField = unknown
+
+    if colParameter is not None:
+        mat.colEditor.hasColParameterField = True
+        mat.colEditor.colParameterField = colParameter
+    else:
+        mat.colEditor.hasColParameterField = False
+        mat.colEditor.colParameterField = 0
+    return mat
+
+
+def validTriangles(model):  # indices of triangles blender can build, skipping duplicate and degenerate ones
+    vertexCount = model.vertexCount
+    seen = set()
+    triangles = []
+    indices = iter(model.vertexIndices)
+    for index, triangle in enumerate(zip(indices, indices, indices)):
+        if triangle[0] == triangle[1] or triangle[1] == triangle[2] or triangle[0] == triangle[2]:
+            continue
+        if max(triangle) >= vertexCount:
+            continue
+        key = tuple(sorted(triangle))  # faces over the same vertices are duplicates whatever their winding
+        if key in seen:
+            continue
+        seen.add(key)
+        triangles.append(index)
+    return triangles
+
+
+def modelFaceValues(model, triangles):  # face attribute values of the given triangles
+    colParameters = gather(model.colParameters, triangles)
+    hasColParameters = gather(model.hasColParameters, triangles)
+    return [array("i", gather(model.colTypes, triangles)),
+            array("i", gather(model.terrainTypes, triangles)),
+            array("i", gather(model.unknowns, triangles)),
+            array("i", [colParameter if hasColParameter else -1
+                        for colParameter, hasColParameter in zip(colParameters, hasColParameters)])]
+
+
+def setFaceMaterials(mesh, values, materials):  # assign one material per distinct collision values, -> materials used
+    slots = {}  # face values -> material index on this mesh
+    materialIndices = array("i", bytes(4*len(values[0])))
+    for i, key in enumerate(zip(*values)):
+        slot = slots.get(key)
+        if slot is None:
+            colType, terrainType, unknown, colParameter = key
+            attributes = (colType, terrainType, unknown, colParameter if colParameter >= 0 else None)
+            mat = materials.get(attributes)
+            if mat is None:
+                mat = materials[attributes] = collisionMaterial(*attributes)
+            mesh.materials.append(mat)  # add material to our object
+            slot = slots[key] = len(mesh.materials) - 1
+        materialIndices[i] = slot
+    mesh.polygons.foreach_set("material_index", materialIndices)
+    return len(slots)
+
+
+def buildMesh(mesh, model, materials=None, profile=NULL_PROFILE, attributes=False):  # fill an empty mesh from a CollisionModel in bulk
+    if materials is None:
+        materials = {}  # (colType, terrainType, unknown, colParameter) -> material
+
+    with profile.phase("filter triangles", triangles=model.triangleCount):
+        triangles = validTriangles(model)
+        triangleCount = len(triangles)
+
+    with profile.phase("build geometry", vertices=model.vertexCount, triangles=triangleCount):
+        mesh.vertices.add(model.vertexCount)
+        mesh.vertices.foreach_set("co", model.vertices)
+        mesh.transform(importMatrix())
+
+        mesh.loops.add(3*triangleCount)
+        mesh.loops.foreach_set("vertex_index", array("i", gather(model.vertexIndices, triangles, 3)))
+        mesh.polygons.add(triangleCount)
+        mesh.polygons.foreach_set("loop_start", array("i", range(0, 3*triangleCount, 3)))
+        if bpy.app.version < (4, 0, 0):
+            mesh.polygons.foreach_set("loop_total", array("i", (3,))*triangleCount)
+
+    with profile.phase("collision values") as phase:
+        values = modelFaceValues(model, triangles)
+        if attributes:
+            writeFaceAttributes(mesh, values)
+        else:
+            createdCount = len(materials)
+            phase.count(materials=setFaceMaterials(mesh, values, materials), createdMaterials=len(materials) - createdCount)
 
-    def __init__(self, x, y, z):
-        self.x = x
-        self.y = y
-        self.z = z
+    with profile.phase("update mesh"):
+        mesh.update(calc_edges=True)
+    return mesh
 
 
-class Group(Struct):
-    collisionType = uint16  # Properties of collision. e.g. is it water? or what?
-    triangleCount = uint16
+class ProfileHelper:  # operator options to profile the phases of an import or export
+    Profile: BoolProperty(
+        name="Profile",
+        description="Report the time, item counts and peak memory of each phase (slower while profiling)",
+        default=False,
+    )
 
-    __padding__ = Padding(1, b"\x00")  # Group flags, set them to 0 here
-    # Set 0x0001 to 1 if we have colParameter values so the game doesn"t ignore it
-    hasColParameter = bool8
-    __padding__ = Padding(2)  # Actual padding
-    vertexindexOffset = uint32
-    terrainTypeOffset = uint32  # 0-18,20,21,23,24,27-31
-    unknownOffset = uint32  # 0-27
-    # 0,1,2,3,4,8,255,6000,7500,7800,8000,8400,9000,10000,10300,12000,14000,17000,19000,20000,21000,22000,27500,30300
-    colParameterOffset = uint32
+    ProfilePath: StringProperty(
+        name="Profile JSON",
+        description="Also write the profile to this JSON file",
+        default="",
+        subtype="FILE_PATH",
+    )
 
+    def createProfile(self):
+        if not self.Profile:
+            return NULL_PROFILE
+        return Profile(self.bl_label, traceMemory=True)
+
+    def reportProfile(self, profile):
+        if profile is NULL_PROFILE:
+            return
+        self.report({"INFO"}, profile.summary())
+        if self.ProfilePath:
+            profile.dump(bpy.path.abspath(self.ProfilePath))
+
+
+def parseCollisionTypes(text):  # "0, 0x100-0x10F" -> set of collision types, None for an empty text
+    text = text.strip()
+    if not text:
+        return None
+    colTypes = set()
+    for part in text.split(","):
+        first, separator, last = part.partition("-")
+        first = int(first, 0)
+        last = int(last, 0) if separator else first
+        colTypes.update(range(first, last + 1))
+    return colTypes
+
+
+def frameAll(context):  # fit every 3D view around the scene
+    for area in context.screen.areas:
+        if area.type != "VIEW_3D":
+            continue
 
-class Triangle(object):
+        area.spaces.active.clip_end = 1000000
+        area.spaces.active.clip_start = 100
+
+        for region in area.regions:
+            if region.type == "WINDOW":
+                override = {"area": area, "region": region, "edit_object": bpy.context.edit_object}
+                bpy.ops.view3d.view_all(override, center=True)
+
+
+class ImportJob(object):
+    """Builds a COL file as one object per chunk of a group, a chunk at a time.
+
+    Triangles are decoded from the memory-mapped file only when their chunk
+    is built, so the UI can keep running between steps.
+    """
+
+    def __init__(self, filepath, collection, colTypes=None, chunkSize=20000, attributes=False, profile=NULL_PROFILE):
+        self.reader = COLReader(filepath)
+        self.collection = collection
+        self.attributes = attributes
+        self.profile = profile
+        self.materials = {}  # shared by all chunks
+        self.objects = []
+        with profile.phase("read vertices", vertices=self.reader.header.vertexCount):
+            self.vertices = self.reader.decodeVertices()
+
+        self.chunks = []  # (group, start, end) in build order
+        for group in self.reader.groups:
+            if colTypes is None or group.collisionType in colTypes:
+                for start in range(0, group.triangleCount, chunkSize):
+                    self.chunks.append((group, start, min(start + chunkSize, group.triangleCount)))
+        self.next = 0
+        self.triangleCount = sum(end - start for group, start, end in self.chunks)
+        self.builtCount = 0
+        self.skippedCount = 0
 
-    def __init__(self):
-        self.vertexIndices = None
-        self.colType = 0
-        self.terrainType = 0
-        self.unknown = 0
-        self.colParameter = None
+    @property
+    def progress(self):
+        return self.builtCount/self.triangleCount if self.triangleCount > 0 else 1.0
 
     @property
-    def hasColParameter(self):
-        return self.colParameter is not None
-
-
-def pack(stream, vertices, triangles):  # pack triangles into col file
-    groups = []
-
-    for triangle in triangles:
-        for group in groups:  # for each triangle add to appropriate group
-            if triangle.colType != group.collisionType:
-                continue  # break out of loop to next cycle
-            group.triangles.append(triangle)
-            break
-        else:  # if no group has been found
-            group = Group()  # create a new group
-            group.collisionType = triangle.colType
-            group.hasColParameter = triangle.hasColParameter
-            group.triangles = [triangle]
-            groups.append(group)  # add to list of groups
-
-    header = Header()
-    header.vertexCount = len(vertices)
-    header.vertexOffset = Header.sizeof() + Group.sizeof()*len(groups)
-    header.groupCount = len(groups)
-    header.groupOffset = Header.sizeof()
-    Header.pack(stream, header)
-
-    stream.write(b"\x00"*Group.sizeof()*len(groups))
-
-    for vertex in vertices:
-        vertex.pack(stream, vertex)
-
-    for group in groups:
-        group.triangleCount = len(group.triangles)
-        group.vertexindexOffset = stream.tell()
-        for triangle in group.triangles:
-            uint16.pack(stream, triangle.vertexIndices[0])
-            uint16.pack(stream, triangle.vertexIndices[1])
-            uint16.pack(stream, triangle.vertexIndices[2])
-
-    for group in groups:
-        group.terrainTypeOffset = stream.tell()
-        for triangle in group.triangles:
-            uint8.pack(stream, triangle.terrainType)
-
-    for group in groups:
-        group.unknownOffset = stream.tell()
-        for triangle in group.triangles:
-            uint8.pack(stream, triangle.unknown)
-
-    for group in groups:
-        if not group.hasColParameter:
-            group.colParameterOffset = 0
+    def done(self):
+        return self.next == len(self.chunks)
+
+    def step(self):  # build the next chunk
+        group, start, end = self.chunks[self.next]
+        self.next += 1
+
+        with self.profile.phase("read triangles", triangles=end - start):
+            model = CollisionModel()
+            model.vertices = self.vertices
+            group.decodeTriangles(model, start, end)
+            chunk = compactModel(model, validTriangles(model))
+
+        mesh = bpy.data.meshes.new("Collision type %d" % group.collisionType)
+        obj = bpy.data.objects.new(mesh.name, mesh)
+        self.collection.objects.link(obj)
+        buildMesh(mesh, chunk, self.materials, self.profile, self.attributes)
+        self.objects.append(obj)
+        self.builtCount += end - start
+        self.skippedCount += end - start - len(mesh.polygons)
+
+    def close(self):
+        self.reader.close()
+
+    def result(self, cancelled):  # -> (report type, message)
+        if cancelled:
+            message = "Import stopped after %d of %d triangles" % (self.builtCount, self.triangleCount)
         else:
-            group.colParameterOffset = stream.tell()
-            for triangle in group.triangles:
-                if triangle.colParameter is not None:
-                    uint16.pack(stream, triangle.colParameter)
-                else:
-                    uint16.pack(stream, 0)
-
-    stream.seek(header.groupOffset)
-    for group in groups:
-        Group.pack(stream, group)
-
-
-def unpack(stream):
-    header = Header.unpack(stream)
-
-    stream.seek(header.groupOffset)
-    groups = [Group.unpack(stream) for _ in range(header.groupCount)]
-
-    stream.seek(header.vertexOffset)
-    vertices = [vertex.unpack(stream) for _ in range(header.vertexCount)]
-
-    for group in groups:
-        group.triangles = [Triangle() for _ in range(group.triangleCount)]
-        for triangle in group.triangles:
-            triangle.colType = group.collisionType
+            message = "Imported %d triangles as %d objects" % (self.triangleCount - self.skippedCount, len(self.objects))
+        if self.skippedCount > 0:
+            message += ", skipped %d degenerate, duplicate or out of range triangles" % self.skippedCount
+        return {"WARNING"} if cancelled or self.skippedCount else {"INFO"}, message
+
+
+def decodeContext():  # multiprocessing context for decode workers
+    context = multiprocessing.get_context("spawn")  # not forked, blender's own threads don't survive a fork
+    if bpy.app.version < (2, 91, 0):  # sys.executable was the blender binary, spawn would start blender
+        context.set_executable(bpy.app.binary_path_python)
+    return context
+
+
+class FilesImportJob(object):
+    """Imports several COL files as one object each.
+
+    The files are decoded by readCOL in a pool of processes, the main thread
+    only builds and links the meshes of decoded files, in the order the files
+    were given. Materials are shared by all the files.
+    """
+
+    def __init__(self, filepaths, collection, colTypes=None, attributes=False, profile=NULL_PROFILE, processes=None):
+        self.filepaths = filepaths
+        self.collection = collection
+        self.attributes = attributes
+        self.profile = profile
+        self.materials = {}  # shared by all files
+        self.objects = []
+        self.failures = []  # (filepath, error)
+        self.triangleCount = 0
+        self.skippedCount = 0
+        self.pool = ProcessPoolExecutor(min(processes or os.cpu_count() or 1, len(filepaths)), decodeContext())
+        self.futures = [self.pool.submit(readCOL, filepath, colTypes) for filepath in filepaths]
+        self.next = 0
 
-    for group in groups:
-        stream.seek(group.vertexindexOffset)
-        for triangle in group.triangles:
-            triangle.vertexIndices = [uint16.unpack(stream) for _ in range(3)]
-
-    for group in groups:
-        stream.seek(group.terrainTypeOffset)
-        for triangle in group.triangles:
-            triangle.terrainType = uint8.unpack(stream)
-
-    for group in groups:
-        stream.seek(group.unknownOffset)
-        for triangle in group.triangles:
-            triangle.unknown = uint8.unpack(stream)
-
-    for group in groups:
-        if not group.hasColParameter:
-            continue
-        stream.seek(group.colParameterOffset)
-        for triangle in group.triangles:
-            triangle.colParameter = uint16.unpack(stream)
-
-    triangles = sum((group.triangles for group in groups), [])
+    @property
+    def progress(self):
+        return self.next/len(self.futures)
 
-    return vertices, triangles
+    @property
+    def done(self):
+        return self.next == len(self.futures)
+
+    def step(self):  # build the next file once it is decoded
+        future = self.futures[self.next]
+        if not future.done():
+            with self.profile.phase("wait for decode"):
+                wait((future,), timeout=0.01)
+            return
+        filepath = self.filepaths[self.next]
+        self.next += 1
+        try:
+            model = future.result()
+        except Exception as error:
+            self.failures.append((filepath, error))
+            return
+
+        name = os.path.splitext(os.path.basename(filepath))[0]
+        mesh = bpy.data.meshes.new(name)
+        obj = bpy.data.objects.new(name, mesh)
+        self.collection.objects.link(obj)
+        buildMesh(mesh, model, self.materials, self.profile, self.attributes)
+        self.objects.append(obj)
+        self.triangleCount += model.triangleCount
+        self.skippedCount += model.triangleCount - len(mesh.polygons)
+
+    def close(self):
+        for future in self.futures:
+            future.cancel()
+        self.pool.shutdown(wait=False)
+
+    def result(self, cancelled):  # -> (report type, message)
+        if cancelled:
+            message = "Import stopped after %d of %d files" % (self.next, len(self.filepaths))
+        else:
+            message = "Imported %d triangles from %d files" % (self.triangleCount - self.skippedCount, len(self.objects))
+        if self.skippedCount > 0:
+            message += ", skipped %d degenerate, duplicate or out of range triangles" % self.skippedCount
+        for filepath, error in self.failures:
+            message += "\n%s: %s" % (os.path.basename(filepath), error)
+        return {"WARNING"} if cancelled or self.failures or self.skippedCount else {"INFO"}, message
 
 
-# Operator that exports the collision model into .col file
-class ImportCOL(Operator, ExportHelper):
+# Operator that imports .col files as collision models
+class ImportCOL(Operator, ImportHelper, ProfileHelper):
     """Import a COL file"""
     bl_idname = "import_mesh.col"
     bl_label = "Import COL"
@@ -212,16 +524,78 @@ class ImportCOL(Operator, ExportHelper):
         options={"HIDDEN"},
     )  # This property filters what you see in the file browser to just .col files
 
-    check_extension = True
-    filename_ext = ".col"  # This is the extension that the model will have
+    filename_ext = ".col"
+
+    Storage: EnumProperty(
+        name="Collision values",
+        description="How the collision values of the faces are stored",
+        items=(("MATERIALS", "Materials", "One material per combination of collision values"),) +
+              ((("ATTRIBUTES", "Face attributes",
+                 "Integer face attributes col_type, terrain_type, unknown and col_parameter (-1 for none)"),)
+               if HAS_FACE_ATTRIBUTES else ()),
+        default="MATERIALS",
+    )
+
+    CollisionTypes: StringProperty(
+        name="Collision types",
+        description="Only import these collision types, as a comma separated list of numbers and ranges "
+                    "(such as 0, 0x100-0x10F). Leave empty to import everything",
+        default="",
+    )
+
+    Progressive: BoolProperty(
+        name="Progressive import",
+        description="Build one object per chunk of triangles while blender stays responsive, press Esc to stop",
+        default=False,
+    )
+
+    ChunkSize: IntProperty(
+        name="Chunk size",
+        description="Most triangles per object in a progressive import",
+        default=20000,
+        min=1000,
+    )
+
+    Processes: IntProperty(
+        name="Decode processes",
+        description="Processes decoding the files when several are selected, each file becomes one object. "
+                    "0 uses one per CPU",
+        default=0,
+        min=0,
+    )
+
+    files: CollectionProperty(
+        type=OperatorFileListElement,
+        options={"HIDDEN", "SKIP_SAVE"},
+    )  # every file selected in the file browser
+
+    directory: StringProperty(
+        subtype="DIR_PATH",
+        options={"HIDDEN", "SKIP_SAVE"},
+    )
 
     def execute(self, context):
         #cleanResources()
-
-        collisionvertexList = []  # Store a list of verticies
-        triangles = []  # List of triangles, each containing indicies of verticies
-        with open(self.filepath, "rb") as colStream:
-            collisionvertexList, triangles = unpack(colStream)
+        try:
+            colTypes = parseCollisionTypes(self.CollisionTypes)
+        except ValueError:
+            self.report({"ERROR"}, "Invalid collision types: %s" % self.CollisionTypes)
+            return {"CANCELLED"}
+        profile = self.createProfile()
+
+        filepaths = [os.path.join(self.directory, file.name) for file in self.files if file.name]
+        if len(filepaths) > 1:
+            job = FilesImportJob(filepaths, context.collection, colTypes, self.Storage == "ATTRIBUTES", profile,
+                                 self.Processes)
+            return self.startJob(context, job)
+
+        if self.Progressive:
+            collection = bpy.data.collections.new(os.path.splitext(os.path.basename(self.filepath))[0])
+            context.scene.collection.children.link(collection)
+            job = ImportJob(self.filepath, collection, colTypes, self.ChunkSize, self.Storage == "ATTRIBUTES", profile)
+            return self.startJob(context, job)
+
+        model = readCOL(self.filepath, colTypes, profile)
 
         mesh = bpy.data.meshes.new("mesh")  # add a new mesh
         # add a new object using the mesh
@@ -232,77 +606,59 @@ class ImportCOL(Operator, ExportHelper):
         context.view_layer.objects.active = obj  # make object active
         obj.select_set(True)  # select object
 
-        mesh = obj.data
-        bm = bmesh.new()
-        bMeshvertexList = []
-
-        for v in collisionvertexList:
-            bMeshvertexList.append(bm.verts.new(
-                (v.x, -v.z, v.y)))  # add a new vert
-
-        for f in triangles:
-            try:  # Try and catch to avoid exception on duplicate triangles. Dodgy...
-                MyFace = bm.faces.new(
-                    (bMeshvertexList[f.vertexIndices[0]], bMeshvertexList[f.vertexIndices[1]], bMeshvertexList[f.vertexIndices[2]]))
-                for i in range(len(obj.data.materials)):  # Scan materials to find match
-                    mat = obj.data.materials[i]
-                    if f.colType == mat.colEditor.colType and f.terrainType == mat.colEditor.terrainType and f.unknown == mat.colEditor.UnknownField:  # Equate unknowns
-                        colParameterAreEqual = (
-                            f.colParameter == mat.colEditor.colParameterField)
-                        # If the colParameter doesn"t exist we need to check for that case
-                        colParameterDontExist = f.colParameter is None and mat.colEditor.hasColParameterField is False
-                        if colParameterAreEqual or colParameterDontExist:
-                            MyFace.material_index = i
-                            break  # We assigned our material
-                else:  # We did not find a material that matched
-                    MaterialName = str(f.colType) + "," + str(f.terrainType) + \
-                        "," + str(f.unknown) + "," + str(f.colParameter)
-                    mat = bpy.data.materials.new(name=MaterialName)
-
-                    random.seed(hash(MaterialName))  # Not actually random
-                    Red = random.random()
-                    Green = random.random()
-                    Blue = random.random()
-                    mat.diffuse_color = (Red, Green, Blue, 1.0)
-
-                    mat.colEditor.colType = f.colType  # Set collision values
-                    mat.colEditor.terrainType = f.terrainType
-                    mat.colEditor.UnknownField = f.unknown
-
-                    if f.colParameter is not None:
-                        mat.colEditor.hasColParameterField = True
-                        mat.colEditor.colParameterField = f.colParameter
-                    else:
-                        mat.colEditor.hasColParameterField = False
-                        mat.colEditor.colParameterField = 0
-                    # add material to our object
-                    obj.data.materials.append(mat)
-                    # Since material was just added it will be the last index
-                    MyFace.material_index = len(obj.data.materials) - 1
-            except:
-                continue
-
-        bm.to_mesh(mesh)
-        mesh.update()
-        bm.free()
-
-        for area in context.screen.areas:
-            if area.type != "VIEW_3D":
-                continue
+        buildMesh(mesh, model, profile=profile, attributes=self.Storage == "ATTRIBUTES")
+        frameAll(context)
 
-            area.spaces.active.clip_end = 1000000
-            area.spaces.active.clip_start = 100
+        skippedCount = model.triangleCount - len(mesh.polygons)
+        if skippedCount > 0:
+            self.report({"WARNING"}, "Skipped %d degenerate, duplicate or out of range triangles" % skippedCount)
 
-            for region in area.regions:
-                if region.type == "WINDOW":
-                    override = {"area": area, "region": region, "edit_object": bpy.context.edit_object}
-                    bpy.ops.view3d.view_all(override, center=True)
+        self.reportProfile(profile)
+        return {"FINISHED"}
 
+    def startJob(self, context, job):  # run an ImportJob or FilesImportJob from modal timer ticks
+        self.job = job
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self.timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def modal(self, context, event):
+        if event.type == "ESC":
+            return self.finishJob(context, cancelled=True)
+        if event.type != "TIMER":
+            return {"PASS_THROUGH"}
+
+        start = time.monotonic()
+        try:
+            while not self.job.done and time.monotonic() - start < 0.05:  # a few chunks per tick
+                self.job.step()
+        except Exception as error:  # such as a section cut short, only the header and group table were checked
+            return self.finishJob(context, error=error)
+        context.window_manager.progress_update(int(self.job.progress*100))
+        if not self.job.done:
+            return {"PASS_THROUGH"}
+        return self.finishJob(context)
+
+    def finishJob(self, context, cancelled=False, error=None):
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        self.job.close()
+        if self.job.objects:
+            frameAll(context)
+        # objects built so far stay, finishing keeps them undoable in one step
+        if error is None:
+            self.report(*self.job.result(cancelled))
+        else:
+            self.report({"ERROR"}, "%s: %s" % (self.job.result(True)[1], error))
+        self.reportProfile(self.job.profile)
         return {"FINISHED"}
 
 
 # Operator that exports the collision model into .col file
-class ExportCOL(Operator, ExportHelper):
+class ExportCOL(Operator, ExportHelper, ProfileHelper):
     """Save a COL file"""
     bl_idname = "export_mesh.col"
     bl_label = "Export COL"
@@ -322,66 +678,416 @@ class ExportCOL(Operator, ExportHelper):
         default=1,
     )
 
+    Weld: BoolProperty(
+        name="Weld vertices",
+        description="Merge vertices closer than the weld distance, shared edges between objects are only written once",
+        default=False,
+    )
+
+    WeldDistance: FloatProperty(
+        name="Weld distance",
+        description="Largest distance between vertices that get merged, after scaling",
+        default=0.001,
+        min=0,
+    )
+
+    UseCache: BoolProperty(
+        name="Incremental export",
+        description="Keep a cache next to the col file and only extract objects that changed since the last export",
+        default=False,
+    )
+
+    Compress: BoolProperty(
+        name="Yaz0 compress",
+        description="Write the col file Yaz0 compressed, ready to go into a stage archive",
+        default=False,
+    )
+
+    CompressLevel: IntProperty(
+        name="Compression level",
+        description="Effort spent finding matches, 0 is fastest and 9 gives the smallest files",
+        default=DEFAULT_LEVEL,
+        min=min(LEVELS),
+        max=max(LEVELS),
+    )
+
+    Validate: BoolProperty(
+        name="Validate",
+        description="Check the exported triangles for degenerate, duplicate, sliver and overlapping faces and report them",
+        default=False,
+    )
+
+    SpatialOrder: BoolProperty(
+        name="Morton order layout",
+        description="Sort vertices and triangles along a Z-order curve so triangles close in space are close in the file, "
+                    "identical scenes give identical files",
+        default=False,
+    )
+
+    Background: BoolProperty(
+        name="Export in background",
+        description="Encode and write the file on a worker thread, press Esc to cancel",
+        default=False,
+    )
+
     # execute() is called by blender when running the operator.
     def execute(self, context):
-        bpy.ops.object.mode_set(mode="OBJECT")
-        bpy.ops.object.transform_apply()
+        profile = self.createProfile()
+        with profile.phase("transform_apply"):
+            bpy.ops.object.mode_set(mode="OBJECT")
+            bpy.ops.object.transform_apply()
+
+        with profile.phase("depsgraph"):
+            depsgraph = context.evaluated_depsgraph_get()
+        matrix = exportMatrix(self.Scale)
+        model = CollisionModel("I")  # Store vertices and triangles, each containing indices of vertices
+
+        cache = None
+        if self.UseCache:
+            cache = ExportCache(os.path.splitext(self.filepath)[0] + ".colcache")
+            cache.load()
 
-        vertexList = []  # Store a list of verticies
-        triangles = []  # List of triangles, each containing indicies of verticies
-        indexOffset = 0  # Since each object starts their vertex indicies at 0, we need to shift these indicies once we add elements to the vertex list from various objects
-        
         for obj in bpy.context.scene.objects:  # for all objects
-            # Set mode to be object mode
             if obj.type != "MESH":
                 continue
-            bm = bmesh.new()  # Define new bmesh
-            # make a copy of the object we can modify freely
-            depsgraph = context.evaluated_depsgraph_get()
-            mesh = obj.evaluated_get(depsgraph).to_mesh()
-            bm.from_mesh(mesh)  # Add the above copy into the bmesh
-            # triangulate bmesh
-            bmesh.ops.triangulate(
-                bm, faces=bm.faces)
-
-            for vert in bm.verts:
-                # add in verts, make sure y is up
-                vertexList.append(
-                    vertex(vert.co.x*self.Scale, vert.co.z*self.Scale, -vert.co.y*self.Scale))
-
-            for Face in bm.faces:
-                myTriangle = Triangle()
-                myTriangle.vertexIndices = [Face.verts[0].index + indexOffset, Face.verts[1].index +
-                                             indexOffset, Face.verts[2].index + indexOffset]  # add three vertex indicies
-
-                slot = obj.material_slots[Face.material_index]
-                mat = slot.material.colEditor
-                if mat is not None:
-                    myTriangle.colType = mat.colType
-                    myTriangle.terrainType = mat.terrainType
-                    myTriangle.unknown = mat.UnknownField
-                    if mat.hasColParameterField == True:
-                        myTriangle.colParameter = mat.colParameterField
-                triangles.append(myTriangle)  # add triangles
-            bm.free()
-            del bm
-            indexOffset = len(vertexList)  # set offset
-
-        with open(self.filepath, "wb") as colStream:
-            pack(colStream, vertexList, triangles)
-        # this lets blender know the operator finished successfully.
+            if cache is None:
+                chunk = extractObject(obj, depsgraph, matrix, profile)
+            else:
+                with profile.phase("hash", objects=1):
+                    key = objectHash(obj, depsgraph, matrix)
+                    chunk = cache.get(obj.name, key)
+                if chunk is None:
+                    chunk = extractObject(obj, depsgraph, matrix, profile)
+                    cache.put(obj.name, key, chunk)
+            # indices of each object start at 0, extend shifts them past the vertices already added
+            with profile.phase("merge"):
+                model.extend(chunk)
+
+        if cache is not None:
+            with profile.phase("save cache"):
+                cache.save()
+
+        job = ExportJob(self.filepath, model, self.WeldDistance if self.Weld else None, profile,
+                        self.CompressLevel if self.Compress else None, self.Validate, self.SpatialOrder)
+        if not self.Background:
+            job.export()
+            self.report({"INFO"}, job.message)
+            self.reportValidation(job.validation)
+            self.reportProfile(profile)
+            # this lets blender know the operator finished successfully.
+            return {"FINISHED"}
+
+        # the model is a snapshot of the scene, the rest can run while the user keeps working
+        self.job = job
+        self.job.start()
+        wm = context.window_manager
+        wm.progress_begin(0, 100)
+        self.timer = wm.event_timer_add(0.1, window=context.window)
+        wm.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def reportValidation(self, validation):
+        if validation is not None and not validation.ok:
+            # the export checks the merged, evaluated and welded triangles, the select operator can only
+            # check each object's own mesh, so problems between objects or from modifiers won't show there
+            self.report({"WARNING"}, "Collision problems in the exported triangles: %s. Select Collision Problems "
+                                     "finds the ones within a single object's mesh" % validation.summary())
+
+    def modal(self, context, event):
+        if event.type == "ESC":
+            self.job.cancel()
+            return {"RUNNING_MODAL"}
+        if event.type != "TIMER":
+            return {"PASS_THROUGH"}
+
+        wm = context.window_manager
+        wm.progress_update(int(self.job.progress*100))
+        if self.job.is_alive():
+            return {"PASS_THROUGH"}
+
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        if self.job.cancelled.is_set() and self.job.progress < 1.0:
+            self.report({"WARNING"}, "Export cancelled")
+            return {"CANCELLED"}
+        if self.job.error is not None:
+            self.report({"ERROR"}, "Export failed: %s" % self.job.error)
+            return {"CANCELLED"}
+        self.report({"INFO"}, self.job.message)
+        self.reportValidation(self.job.validation)
+        self.reportProfile(self.job.profile)
+        return {"FINISHED"}
+
+
+class MaterialsToAttributes(Operator):
+    """Store the collision values of the materials of the selected objects as face attributes"""
+    bl_idname = "object.col_materials_to_attributes"
+    bl_label = "Collision Materials to Attributes"
+    bl_options = {"REGISTER", "UNDO"}
+
+    RemoveMaterials: BoolProperty(
+        name="Remove materials",
+        description="Clear the material slots once their values are stored on the faces",
+        default=False,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return HAS_FACE_ATTRIBUTES and context.mode == "OBJECT" and \
+            any(obj.type == "MESH" for obj in context.selected_objects)
+
+    def execute(self, context):
+        count = 0
+        for obj in context.selected_objects:
+            if obj.type != "MESH":
+                continue
+            writeFaceAttributes(obj.data, slotFaceValues(obj))
+            if self.RemoveMaterials:
+                obj.data.materials.clear()
+            count += 1
+        self.report({"INFO"}, "Stored collision attributes on %d objects" % count)
+        return {"FINISHED"}
+
+
+class AttributesToMaterials(Operator):
+    """Replace the collision face attributes of the selected objects with one material per combination"""
+    bl_idname = "object.col_attributes_to_materials"
+    bl_label = "Collision Attributes to Materials"
+    bl_options = {"REGISTER", "UNDO"}
+
+    RemoveAttributes: BoolProperty(
+        name="Remove attributes",
+        description="Remove the face attributes, otherwise they keep taking precedence on export",
+        default=True,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return HAS_FACE_ATTRIBUTES and context.mode == "OBJECT" and \
+            any(obj.type == "MESH" for obj in context.selected_objects)
+
+    def execute(self, context):
+        materials = {}  # existing materials are reused for their collision values
+        for mat in bpy.data.materials:
+            values = mat.colEditor
+            colParameter = values.colParameterField if values.hasColParameterField else None
+            materials.setdefault((values.colType, values.terrainType, values.UnknownField, colParameter), mat)
+
+        count = 0
+        for obj in context.selected_objects:
+            if obj.type != "MESH":
+                continue
+            values = readFaceAttributes(obj.data)
+            if values is None:
+                continue
+            obj.data.materials.clear()
+            setFaceMaterials(obj.data, values, materials)
+            if self.RemoveAttributes:
+                removeFaceAttributes(obj.data)
+            count += 1
+        self.report({"INFO"}, "Assigned collision materials to %d objects" % count)
         return {"FINISHED"}
 
 
+def meshModel(obj):  # -> (CollisionModel of the object's own mesh in world space, polygon of each triangle)
+    mesh = obj.data
+    mesh.calc_loop_triangles()
+    model = CollisionModel("I")
+    coordinates = array("f", bytes(12*len(mesh.vertices)))
+    mesh.vertices.foreach_get("co", coordinates)
+    (a, b, c, d), (e, f, g, h), (i, j, k, l) = [tuple(row) for row in obj.matrix_world][:3]
+    xs = iter(coordinates)
+    for x, y, z in zip(xs, xs, xs):
+        model.addVertex(a*x + b*y + c*z + d, e*x + f*y + g*z + h, i*x + j*y + k*z + l)
+
+    triangleCount = len(mesh.loop_triangles)
+    vertexIndices = array("i", bytes(12*triangleCount))
+    mesh.loop_triangles.foreach_get("vertices", vertexIndices)
+    model.vertexIndices = array("I", vertexIndices)
+    polygonIndices = array("i", bytes(4*triangleCount))
+    mesh.loop_triangles.foreach_get("polygon_index", polygonIndices)
+    return model, polygonIndices
+
+
+class SelectCollisionProblems(Operator):
+    """Select the faces of the selected objects that would make broken collision triangles"""
+    bl_idname = "object.col_select_problems"
+    bl_label = "Select Collision Problems"
+    bl_options = {"REGISTER", "UNDO"}
+
+    Problems: EnumProperty(
+        name="Problems",
+        description="Which problems to select",
+        items=[("ALL", "All", "Every kind of problem")] + [(problem, problem.capitalize(), "") for problem in PROBLEMS],
+        default="ALL",
+    )
+
+    Tolerance: FloatProperty(
+        name="Tolerance",
+        description="Distance under which coplanar faces count as overlapping",
+        default=0.001,
+        min=0,
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == "OBJECT" and any(obj.type == "MESH" for obj in context.selected_objects)
+
+    def execute(self, context):
+        problems = PROBLEMS if self.Problems == "ALL" else (self.Problems,)
+        found = 0
+        counts = {}
+        for obj in context.selected_objects:
+            if obj.type != "MESH":
+                continue
+            model, polygonIndices = meshModel(obj)
+            validation = validateModel(model, self.Tolerance)
+            for problem, count in validation.counts().items():
+                if problem in problems:
+                    counts[problem] = counts.get(problem, 0) + count
+
+            mesh = obj.data
+            polygonSelection = array("B", bytes(len(mesh.polygons)))
+            vertexSelection = array("B", bytes(len(mesh.vertices)))
+            for triangle in validation.triangles(problems):
+                polygonSelection[polygonIndices[triangle]] = 1
+                for index in model.vertexIndices[3*triangle:3*triangle + 3]:
+                    if index < len(vertexSelection):
+                        vertexSelection[index] = 1
+            mesh.polygons.foreach_set("select", polygonSelection)
+            mesh.vertices.foreach_set("select", vertexSelection)
+            found += sum(polygonSelection)
+
+        if found == 0:
+            self.report({"INFO"}, "No collision problems found")
+            return {"FINISHED"}
+        self.report({"WARNING"}, "Selected %d faces: %s" %
+                    (found, ", ".join("%d %s" % (count, problem) for problem, count in counts.items())))
+        bpy.ops.object.mode_set(mode="EDIT")  # show the selection
+        return {"FINISHED"}
+
+
+class CollisionUsage:
+    """Faces using each material and each collision type, for the panel.
+
+    Nothing is polled: mesh changes and mesh objects joining or leaving the
+    scene mark the face counts stale and they are recounted once edits have
+    paused for DELAY seconds. The totals
+    per collision type only go stale when a CollisionProperties value
+    changes. An idle scene never recounts anything.
+    """
+
+    DELAY = 0.5
+
+    def __init__(self):
+        self.materialCounts = None  # material name -> [objects, faces], None while stale
+        self.typeCounts = None  # colType -> faces, None while stale
+        self.meshObjects = None  # names of the mesh objects counted
+        self.changedAt = 0.0
+
+    def invalidate(self):  # geometry, material slots or scene objects changed
+        self.materialCounts = None
+        self.typeCounts = None
+        self.changedAt = time.monotonic()
+        if not bpy.app.timers.is_registered(recountCollisionUsage):
+            bpy.app.timers.register(recountCollisionUsage, first_interval=self.DELAY)
+
+    def invalidateTypes(self):  # collision values changed, the faces per material are still valid
+        self.typeCounts = None
+
+    def meshObjectsChanged(self, scene):  # scene updates also come for selection and transforms
+        return self.meshObjects != set(obj.name for obj in scene.objects if obj.type == "MESH")
+
+    def recount(self, scene):
+        counts = {}
+        self.meshObjects = set(obj.name for obj in scene.objects if obj.type == "MESH")
+        for obj in scene.objects:
+            if obj.type != "MESH" or obj.data is None:
+                continue
+            polygons = obj.data.polygons
+            materialIndices = array("i", bytes(4*len(polygons)))
+            polygons.foreach_get("material_index", materialIndices)
+            slots = [slot.material for slot in obj.material_slots]
+            if not slots:
+                continue
+            objectFaces = Counter()  # material name -> faces of this object
+            for index, faces in Counter(materialIndices).items():
+                mat = slots[min(index, len(slots) - 1)]  # out of range faces use the last slot
+                if mat is not None:
+                    objectFaces[mat.name] += faces
+            for name, faces in objectFaces.items():
+                count = counts.setdefault(name, [0, 0])
+                count[0] += 1
+                count[1] += faces
+        self.materialCounts = counts
+        self.typeCounts = None
+
+    def materialUsage(self, mat):  # -> (objects, faces), None until counted
+        if self.materialCounts is None:
+            return None
+        return tuple(self.materialCounts.get(mat.name, (0, 0)))
+
+    def typeUsage(self, colType):  # -> faces of every material with this collision type, None until counted
+        if self.materialCounts is None:
+            return None
+        if self.typeCounts is None:
+            self.typeCounts = Counter()
+            for name, (objects, faces) in self.materialCounts.items():
+                mat = bpy.data.materials.get(name)
+                if mat is not None:
+                    self.typeCounts[mat.colEditor.colType] += faces
+        return self.typeCounts[colType]
+
+
+collisionUsage = CollisionUsage()
+
+
+def recountCollisionUsage():  # debounce timer, runs once edits have paused
+    remaining = collisionUsage.DELAY - (time.monotonic() - collisionUsage.changedAt)
+    if remaining > 0:
+        return remaining
+    collisionUsage.recount(bpy.context.scene)
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == "PROPERTIES":
+                area.tag_redraw()
+    return None
+
+
+@persistent
+def collisionDepsgraphUpdate(scene, depsgraph=None):
+    if depsgraph is None:  # handlers only get the depsgraph from blender 2.81 on
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+    sceneUpdated = False
+    for update in depsgraph.updates:
+        if isinstance(update.id, (bpy.types.Object, bpy.types.Mesh)) and \
+                (update.is_updated_geometry or update.is_updated_shading):
+            collisionUsage.invalidate()  # moving objects around doesn't count
+            return
+        if isinstance(update.id, (bpy.types.Scene, bpy.types.Collection)):
+            sceneUpdated = True
+    if sceneUpdated and collisionUsage.meshObjectsChanged(scene):  # objects added, removed or renamed
+        collisionUsage.invalidate()
+
+
+@persistent
+def collisionLoadPost(*args):
+    collisionUsage.invalidate()
+
+
+def collisionValuesChanged(self, context):
+    collisionUsage.invalidateTypes()
+
+
 class CollisionProperties(PropertyGroup):  # This defines the UI elements
     # Here we put parameters for the UI elements and point to the Update functions
-    colType: IntProperty(name="Collision type", default=0, min=0, max=65535)
-    terrainType: IntProperty(name="Sound", default=0, min=0, max=255)
+    colType: IntProperty(name="Collision type", default=0, min=0, max=65535, update=collisionValuesChanged)
+    terrainType: IntProperty(name="Sound", default=0, min=0, max=255, update=collisionValuesChanged)
     # I probably should have made these an array
-    UnknownField: IntProperty(name="Unknown", default=0, min=0, max=255)
-    hasColParameterField: BoolProperty(name="Has Parameter", default=False)
+    UnknownField: IntProperty(name="Unknown", default=0, min=0, max=255, update=collisionValuesChanged)
+    hasColParameterField: BoolProperty(name="Has Parameter", default=False, update=collisionValuesChanged)
     colParameterField: IntProperty(
-        name="Parameter", default=0, min=0, max=65535)
+        name="Parameter", default=0, min=0, max=65535, update=collisionValuesChanged)
 
 
 # This panel houses the UI elements defined in the CollisionProperties
@@ -408,6 +1114,16 @@ class COLLISION_PT_panel(Panel):
         # must have "Has colParameter" checked
         column2.enabled = mat.hasColParameterField
 
+        usage = collisionUsage.materialUsage(context.material)
+        column3 = self.layout.column(align=True)
+        if usage is None:
+            column3.label(text="Counting faces...")
+            if not bpy.app.timers.is_registered(recountCollisionUsage):
+                collisionUsage.invalidate()
+        else:
+            column3.label(text="Used by %d faces in %d objects" % (usage[1], usage[0]))
+            column3.label(text="Collision type %d: %d faces" % (mat.colType, collisionUsage.typeUsage(mat.colType)))
+
 
 def check_material(mat):
     if mat is not None:
@@ -421,6 +1137,9 @@ def check_material(mat):
 
 __classes__ = (ExportCOL,
                ImportCOL,
+               MaterialsToAttributes,
+               AttributesToMaterials,
+               SelectCollisionProblems,
                COLLISION_PT_panel,
                CollisionProperties)  # list of classes to register/unregister
 
@@ -433,6 +1152,9 @@ def register():
         type=CollisionProperties)  # store in the scene
     bpy.types.TOPBAR_MT_file_export.append(menu_export)  # Add to export menu
     bpy.types.TOPBAR_MT_file_import.append(menu_import)  # Add to import menu
+    bpy.types.VIEW3D_MT_object.append(menu_convert)
+    bpy.app.handlers.depsgraph_update_post.append(collisionDepsgraphUpdate)
+    bpy.app.handlers.load_post.append(collisionLoadPost)
 
 
 def unregister():
@@ -441,6 +1163,11 @@ def unregister():
         unregister_class(cls)
     bpy.types.TOPBAR_MT_file_export.remove(menu_export)
     bpy.types.TOPBAR_MT_file_import.remove(menu_import)
+    bpy.types.VIEW3D_MT_object.remove(menu_convert)
+    bpy.app.handlers.depsgraph_update_post.remove(collisionDepsgraphUpdate)
+    bpy.app.handlers.load_post.remove(collisionLoadPost)
+    if bpy.app.timers.is_registered(recountCollisionUsage):
+        bpy.app.timers.unregister(recountCollisionUsage)
 
 
 def menu_export(self, context):
@@ -451,6 +1178,14 @@ def menu_import(self, context):
     self.layout.operator(ImportCOL.bl_idname, text="Collision (.col)")
 
 
+def menu_convert(self, context):
+    self.layout.separator()
+    if HAS_FACE_ATTRIBUTES:
+        self.layout.operator(MaterialsToAttributes.bl_idname)
+        self.layout.operator(AttributesToMaterials.bl_idname)
+    self.layout.operator(SelectCollisionProblems.bl_idname)
+
+
 # This allows you to run the script directly from blenders text editor
 # to test the addon without having to install it.
 if __name__ == "__main__":
@@ -0,0 +1,4 @@
+"""Benchmarks for colcodec, btypes and the BlenderCOL operators.
+
+They run without blender, see python -m benchmarks.codec --help.
+"""
@@ -0,0 +1,213 @@
+"""Throughput, peak memory and allocations of the COL codec and btypes.
+
+    python -m benchmarks.codec
+    python -m benchmarks.codec --sizes 1000 1000000 --save baseline.json
+    python -m benchmarks.codec --baseline baseline.json
+
+Every stage is timed as the best of --repeat runs, then run once more under
+tracemalloc for its peak memory and the number of blocks it leaves
+allocated. A baseline stores these results, comparing against one flags
+every stage that got slower or bigger by more than --threshold and exits
+with status 1.
+"""
+
+from benchmarks.synthetic import *
+from colcodec import *
+from btypes.big_endian import *
+import argparse
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def measure(function, repeat):  # -> (best seconds, peak bytes, blocks left allocated)
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    blocks = sys.getallocatedblocks() - blocks
+    del result
+    return best, peak, blocks
+
+
+def codecStages(model, directory):  # (name, items, function) for every codec stage
+    data = bytes(encode(model))
+    path = os.path.join(directory, "stage.col")
+    with open(path, "wb") as stream:
+        stream.write(data)
+
+    floored = flooredModel(model)  # one huge triangle must not cost more than the small ones
+
+    def mapped():
+        with COLReader(path) as reader:
+            return reader.decode()
+
+    def mappedGroup():  # what a single collision type query costs
+        with COLReader(path) as reader:
+            group = reader.groups[0]
+            return group.decodeVertexIndices(), group.decodeTerrainTypes()
+
+    return [("group", model.triangleCount, lambda: groupTriangles(model)),
+            ("encode", model.triangleCount, lambda: encode(model)),
+            ("pack", model.triangleCount, lambda: pack(io.BytesIO(), model)),
+            ("unpack", model.triangleCount, lambda: unpack(io.BytesIO(data))),
+            ("mapped decode", model.triangleCount, mapped),
+            ("mapped group", 1, mappedGroup),
+            ("validate", model.triangleCount, lambda: validateModel(model)),
+            ("validate, floor", floored.triangleCount, lambda: validateModel(floored))]
+
+
+def btypesStages(count):  # (name, items, function) for the btypes primitives
+    groups = []
+    for i in range(count):
+        group = Group()
+        group.collisionType = i & 0xFFFF
+        group.triangleCount = i & 0xFFFF
+        group.hasColParameter = i & 1
+        group.vertexindexOffset = group.terrainTypeOffset = group.unknownOffset = group.colParameterOffset = i
+        groups.append(group)
+
+    stream = io.BytesIO()
+    for group in groups:
+        Group.pack(stream, group)
+    groupData = stream.getvalue()
+    valueData = groupData[:2*count]
+
+    def structPack():
+        stream = io.BytesIO()
+        for group in groups:
+            Group.pack(stream, group)
+        return stream
+
+    def structUnpack():
+        stream = io.BytesIO(groupData)
+        return [Group.unpack(stream) for _ in range(count)]
+
+    def structUnpackFrom():
+        return [Group.unpack_from(groupData, i*Group.sizeof()) for i in range(count)]
+
+    def basicPack():
+        stream = io.BytesIO()
+        for i in range(count):
+            uint16.pack(stream, i & 0xFFFF)
+        return stream
+
+    def basicUnpack():
+        stream = io.BytesIO(valueData)
+        return [uint16.unpack(stream) for _ in range(count)]
+
+    def cursorUnpack():
+        cursor = Cursor(groupData)
+        return [Group.unpack(cursor) for _ in range(count)]
+
+    valueArray = Array(uint16, count)
+    stringData = b"".join(b"string%d\0" % i for i in range(count))
+
+    def arrayUnpack():
+        return valueArray.unpack(Cursor(valueData))
+
+    def stringUnpack():
+        stream = io.BytesIO(stringData)
+        return [cstring.unpack(stream) for _ in range(count)]
+
+    def cursorStringUnpack():
+        cursor = Cursor(stringData)
+        return [cstring.unpack(cursor) for _ in range(count)]
+
+    return [("Struct.pack", count, structPack),
+            ("Struct.unpack", count, structUnpack),
+            ("Struct.unpack_from", count, structUnpackFrom),
+            ("Struct.unpack, Cursor", count, cursorUnpack),
+            ("BasicType.pack", count, basicPack),
+            ("BasicType.unpack", count, basicUnpack),
+            ("Array.unpack, Cursor", count, arrayUnpack),
+            ("CString.unpack", count, stringUnpack),
+            ("CString.unpack, Cursor", count, cursorStringUnpack)]
+
+
+def run(args):
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            for groupCount in args.groups:
+                for density in args.density:
+                    model = syntheticModel(size, groupCount, density)
+                    case = "%d triangles, %d groups, %g colParameter" % (size, groupCount, density)
+                    for name, items, function in codecStages(model, directory):
+                        results["%s: %s" % (case, name)] = (items, measure(function, args.repeat))
+
+        for size in args.sizes:
+            for name, items, function in btypesStages(min(size, args.struct_limit)):
+                results["%d records: %s" % (items, name)] = (items, measure(function, args.repeat))
+
+    report = {}
+    for key, (items, (seconds, peak, blocks)) in results.items():
+        report[key] = {"seconds": seconds,
+                       "itemsPerSecond": items/seconds if seconds > 0 else None,
+                       "peakBytes": peak,
+                       "blocks": blocks}
+        print("%-70s %10.2f ms %12s items/s %10.1f KiB peak %8d blocks" % (
+            key, seconds*1000, "%.0f" % (items/seconds) if seconds > 0 else "-", peak/1024, blocks))
+    return report
+
+
+def compare(report, baseline, threshold):  # -> list of regression messages
+    regressions = []
+    for key, result in report.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        if result["seconds"] > previous["seconds"]*(1 + threshold):
+            regressions.append("%s: %.2f ms, baseline %.2f ms" % (key, result["seconds"]*1000, previous["seconds"]*1000))
+        if result["peakBytes"] > previous["peakBytes"]*(1 + threshold):
+            regressions.append("%s: %d bytes peak, baseline %d" % (key, result["peakBytes"], previous["peakBytes"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.codec", description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="triangle counts (default: 1000 10000 100000)")
+    parser.add_argument("--groups", type=int, nargs="+", default=[1, 16, 256], help="group counts (default: 1 16 256)")
+    parser.add_argument("--density", type=float, nargs="+", default=[0.0, 0.5],
+                        help="share of groups with a colParameter (default: 0 0.5)")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage, the best counts (default: 3)")
+    parser.add_argument("--struct-limit", type=int, default=100000, help="most records in the btypes stages (default: 100000)")
+    parser.add_argument("--save", metavar="FILE", help="store the results as a baseline")
+    parser.add_argument("--baseline", metavar="FILE", help="flag stages that regressed against this baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown or growth (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+
+    if args.save:
+        with open(args.save, "w") as stream:
+            json.dump(report, stream, indent=4, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as stream:
+            regressions = compare(report, json.load(stream), args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
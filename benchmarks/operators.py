@@ -0,0 +1,176 @@
+"""ImportCOL and ExportCOL driven over synthetic scenes, against a stub bpy.
+
+    python -m benchmarks.operators
+    python -m benchmarks.operators --objects 200 --faces 5000 --import-triangles 100000
+
+The operators run against benchmarks/stubbpy, a stand-in for the bpy
+surfaces they use, so their Python side can be profiled without blender.
+The time of each phase is measured by wrapping the functions the operators
+call. Calls that blender runs in C (Mesh.transform, calc_loop_triangles)
+are emulated in Python by the stub and counted as part of their phase.
+"""
+
+from benchmarks.synthetic import *
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+
+STUBS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stubbpy")
+
+
+def loadAddon():  # import BlenderCOL against the stub bpy
+    if STUBS not in sys.path:
+        sys.path.insert(0, STUBS)
+    import bpy
+    import BlenderCOL
+    return bpy, BlenderCOL
+
+
+class PhaseTimer(object):
+    """Wraps module functions to add up the time spent in them."""
+
+    def __init__(self):
+        self.phases = {}  # name -> [calls, seconds]
+        self.wrapped = []
+
+    def wrap(self, module, name):
+        function = getattr(module, name)
+        phase = self.phases.setdefault(name, [0, 0.0])
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                phase[0] += 1
+                phase[1] += time.perf_counter() - start
+
+        setattr(module, name, timed)
+        self.wrapped.append((module, name, function))
+
+    def restore(self):
+        for module, name, function in reversed(self.wrapped):
+            setattr(module, name, function)
+        self.wrapped = []
+
+    def reset(self):
+        for phase in self.phases.values():
+            phase[0] = 0
+            phase[1] = 0.0
+
+
+def collisionMaterials(bpy, count):  # materials with distinct collision values
+    materials = []
+    for i in range(count):
+        mat = bpy.data.materials.new("collision%d" % i)
+        mat.colEditor.colType = 0x100 + i
+        mat.colEditor.terrainType = i % 32
+        mat.colEditor.UnknownField = i % 28
+        mat.colEditor.hasColParameterField = i % 3 == 0
+        mat.colEditor.colParameterField = 1000*i % 0x10000
+        materials.append(mat)
+    return materials
+
+
+def gridObject(bpy, name, faceCount, materials, offset):  # object with a grid of quads cycling through materials
+    width = max(1, int(faceCount**0.5))
+    rows = max(1, faceCount//width)
+    mesh = bpy.data.meshes.new(name)
+    mesh.vertices.add((width + 1)*(rows + 1))
+    co = []
+    for row in range(rows + 1):
+        for column in range(width + 1):
+            co.extend((offset + column, row, (column*row) % 7))
+    mesh.vertices.foreach_set("co", co)
+
+    quads = width*rows
+    mesh.loops.add(4*quads)
+    loops = []
+    for row in range(rows):
+        for column in range(width):
+            v = row*(width + 1) + column
+            loops.extend((v, v + 1, v + width + 2, v + width + 1))
+    mesh.loops.foreach_set("vertex_index", loops)
+    mesh.polygons.add(quads)
+    mesh.polygons.foreach_set("loop_start", range(0, 4*quads, 4))
+    mesh.polygons.foreach_set("loop_total", [4]*quads)
+    mesh.polygons.foreach_set("material_index", [i % len(materials) for i in range(quads)])
+    mesh.materials.extend(materials)
+
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.collection.objects.link(obj)
+    return obj
+
+
+def exportScene(bpy, args):
+    bpy.reset()
+    materials = collisionMaterials(bpy, args.materials)
+    for i in range(args.objects):
+        gridObject(bpy, "object%d" % i, args.faces, materials, i*1000)
+
+
+def report(title, seconds, phases):
+    print("%s: %.1f ms" % (title, seconds*1000))
+    for name, (calls, phaseSeconds) in sorted(phases.items(), key=lambda item: -item[1][1]):
+        if calls:
+            print("    %-24s %10.1f ms %8d calls" % (name, phaseSeconds*1000, calls))
+
+
+def run(args):
+    bpy, BlenderCOL = loadAddon()
+    import colcodec.export
+    import colcodec.reader
+
+    timer = PhaseTimer()
+    for name in ("extractObject", "objectHash", "readCOL", "validTriangles", "buildMesh", "collisionMaterial"):
+        timer.wrap(BlenderCOL, name)
+    timer.wrap(colcodec.reader, "unpack")
+    for name in ("weldVertices", "partitionModel", "encode", "chunkFiles", "writeFile"):
+        timer.wrap(colcodec.export, name)
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            exportScene(bpy, args)
+            for title, options in (("export", {}),
+                                   ("export, weld", {"Weld": True}),
+                                   ("export, cache cold", {"UseCache": True}),
+                                   ("export, cache warm", {"UseCache": True})):
+                operator = BlenderCOL.ExportCOL()
+                operator.filepath = os.path.join(directory, "export.col")
+                for name, value in options.items():
+                    setattr(operator, name, value)
+                timer.reset()
+                start = time.perf_counter()
+                operator.execute(bpy.context)
+                report("%s (%d objects, %d faces each)" % (title, args.objects, args.faces),
+                       time.perf_counter() - start, timer.phases)
+
+            path = os.path.join(directory, "import.col")
+            with open(path, "wb") as stream:
+                stream.write(encode(syntheticModel(args.import_triangles, args.materials, 0.3)))
+            bpy.reset()
+            operator = BlenderCOL.ImportCOL()
+            operator.filepath = path
+            timer.reset()
+            start = time.perf_counter()
+            operator.execute(bpy.context)
+            report("import (%d triangles)" % args.import_triangles, time.perf_counter() - start, timer.phases)
+    finally:
+        timer.restore()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.operators", description=__doc__.splitlines()[0])
+    parser.add_argument("--objects", type=int, default=50, help="objects in the export scene (default: 50)")
+    parser.add_argument("--faces", type=int, default=2000, help="quads per object (default: 2000)")
+    parser.add_argument("--materials", type=int, default=16, help="collision materials (default: 16)")
+    parser.add_argument("--import-triangles", type=int, default=60000, help="triangles in the imported file (default: 60000)")
+    run(parser.parse_args(argv))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,18 @@
+"""Stand-in for the parts of blender's bpy module that BlenderCOL uses.
+
+Only meant for benchmarking the operators without blender. Mesh data is kept
+in flat arrays like blender does, but everything blender does in C (such as
+Mesh.transform or calc_loop_triangles) runs in Python here, so time spent in
+those calls is not representative.
+"""
+
+from bpy import app, ops, path, props, types, utils
+
+
+def reset():  # start over with empty blend data and a fresh context
+    global data, context
+    data = types.BlendData()
+    context = types.Context(data)
+
+
+reset()
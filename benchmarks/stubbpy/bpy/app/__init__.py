@@ -0,0 +1,4 @@
+from bpy.app import handlers, timers
+
+
+version = (3, 6, 0)
@@ -0,0 +1,8 @@
+depsgraph_update_post = []
+load_post = []
+undo_post = []
+redo_post = []
+
+
+def persistent(function):
+    return function
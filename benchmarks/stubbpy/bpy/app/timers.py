@@ -0,0 +1,20 @@
+registered = []
+
+
+def register(function, first_interval=0, persistent=False):
+    registered.append(function)
+
+
+def unregister(function):
+    registered.remove(function)
+
+
+def is_registered(function):
+    return function in registered
+
+
+def run():  # call registered timers until they all stop, like blender's event loop would
+    while registered:
+        for function in list(registered):
+            if function() is None and function in registered:
+                registered.remove(function)
@@ -0,0 +1,10 @@
+from types import SimpleNamespace
+
+
+def finished(*args, **kwargs):
+    return {"FINISHED"}
+
+
+object = SimpleNamespace(mode_set=finished, transform_apply=finished, delete=finished)
+view3d = SimpleNamespace(view_all=finished)
+mesh = SimpleNamespace(select_all=finished)
@@ -0,0 +1,7 @@
+import os
+
+
+def abspath(path, start=None, library=None):  # "//" is relative to the blend file, here the working directory
+    if path.startswith("//"):
+        path = os.path.join(start or os.getcwd(), path[2:])
+    return os.path.abspath(path)
@@ -0,0 +1,35 @@
+class Property(object):
+
+    def __init__(self, default, **options):
+        self.default = default
+        self.options = options
+
+
+def BoolProperty(default=False, **options):
+    return Property(default, **options)
+
+
+def IntProperty(default=0, **options):
+    return Property(default, **options)
+
+
+def FloatProperty(default=0.0, **options):
+    return Property(default, **options)
+
+
+def StringProperty(default="", **options):
+    return Property(default, **options)
+
+
+def EnumProperty(items=(), default=None, **options):
+    if default is None and items:
+        default = items[0][0]
+    return Property(default, items=items, **options)
+
+
+def PointerProperty(type=None, **options):
+    return Property(None, type=type, **options)
+
+
+def CollectionProperty(type=None, **options):
+    return Property([], type=type, **options)
@@ -0,0 +1,393 @@
+from array import array
+from mathutils import Matrix
+from bpy.props import Property
+
+
+class bpy_struct(object):
+    pass
+
+
+class PropertyGroup(bpy_struct):
+
+    def __init__(self):
+        for name, prop in annotatedProperties(type(self)):
+            setattr(self, name, prop.default)
+
+
+class Operator(bpy_struct):
+
+    def __init__(self):
+        for name, prop in annotatedProperties(type(self)):
+            setattr(self, name, prop.default)
+        self.reports = []
+
+    def report(self, type, message):
+        self.reports.append((type, message))
+
+
+class OperatorFileListElement(PropertyGroup):  # an entry of an operator's files, a file name in directory
+
+    def __init__(self, name=""):
+        self.name = name
+
+
+class Panel(bpy_struct):
+    pass
+
+
+class Menu(bpy_struct):
+    functions = []
+
+    @classmethod
+    def append(cls, function):
+        cls.functions.append(function)
+
+    @classmethod
+    def remove(cls, function):
+        cls.functions.remove(function)
+
+
+class TOPBAR_MT_file_export(Menu):
+    functions = []
+
+
+class TOPBAR_MT_file_import(Menu):
+    functions = []
+
+
+class VIEW3D_MT_object(Menu):
+    functions = []
+
+
+def annotatedProperties(cls):  # (name, Property) of a class and its bases, the way blender registers them
+    properties = {}
+    for base in reversed(cls.__mro__):
+        for name, prop in getattr(base, "__annotations__", {}).items():
+            if isinstance(prop, Property):
+                properties[name] = prop
+    return properties.items()
+
+
+class PropertyCollection(object):
+    """Mesh element collection backed by one flat array per attribute."""
+
+    def __init__(self, attributes):
+        self.attributes = attributes  # name -> (typecode, values per element)
+        self.values = {name: array(typecode) for name, (typecode, size) in attributes.items()}
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, count):
+        for name, (typecode, size) in self.attributes.items():
+            self.values[name].extend(array(typecode, (0,))*(size*count))
+        self.count += count
+
+    def clear(self):
+        for name, (typecode, size) in self.attributes.items():
+            self.values[name] = array(typecode)
+        self.count = 0
+
+    def foreach_get(self, name, sequence):
+        values = self.values[name]
+        if len(sequence) != len(values):
+            raise RuntimeError("foreach_get(%r): expected %d values, got %d" % (name, len(values), len(sequence)))
+        if isinstance(sequence, array) and sequence.typecode != values.typecode:
+            values = array(sequence.typecode, values)
+        sequence[:] = values
+
+    def foreach_set(self, name, sequence):
+        typecode, size = self.attributes[name]
+        if len(sequence) != size*self.count:
+            raise RuntimeError("foreach_set(%r): expected %d values, got %d" % (name, size*self.count, len(sequence)))
+        self.values[name] = array(typecode, sequence)
+
+    def copy(self):
+        other = PropertyCollection(self.attributes)
+        other.values = {name: array(values.typecode, values) for name, values in self.values.items()}
+        other.count = self.count
+        return other
+
+
+class Attribute(bpy_struct):
+
+    def __init__(self, name, data_type, domain, count):
+        self.name = name
+        self.data_type = data_type
+        self.domain = domain
+        self.data = PropertyCollection({"value": ("f" if data_type == "FLOAT" else "i", 1)})
+        self.data.add(count)
+
+
+class AttributeGroup(object):  # Mesh.attributes, only face attributes are backed by data here
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.attributes = {}
+
+    def __iter__(self):
+        return iter(self.attributes.values())
+
+    def get(self, name, default=None):
+        return self.attributes.get(name, default)
+
+    def new(self, name, type, domain):
+        attribute = self.attributes[name] = Attribute(name, type, domain, len(self.mesh.polygons))
+        return attribute
+
+    def remove(self, attribute):
+        del self.attributes[attribute.name]
+
+
+class ID(bpy_struct):
+
+    def __init__(self, name):
+        self.name = name
+        self.users = 0
+
+
+class Mesh(ID):
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.vertices = PropertyCollection({"co": ("f", 3), "select": ("B", 1)})
+        self.loops = PropertyCollection({"vertex_index": ("i", 1)})
+        self.polygons = PropertyCollection({"loop_start": ("i", 1),
+                                            "loop_total": ("i", 1),
+                                            "material_index": ("i", 1),
+                                            "select": ("B", 1)})
+        self.loop_triangles = PropertyCollection({"vertices": ("i", 3),
+                                                  "material_index": ("i", 1),
+                                                  "polygon_index": ("i", 1)})
+        self.materials = []
+        self.attributes = AttributeGroup(self)
+
+    def copy(self):
+        mesh = Mesh(self.name)
+        mesh.vertices = self.vertices.copy()
+        mesh.loops = self.loops.copy()
+        mesh.polygons = self.polygons.copy()
+        mesh.materials = list(self.materials)
+        for attribute in self.attributes:
+            copied = mesh.attributes.new(attribute.name, attribute.data_type, attribute.domain)
+            copied.data = attribute.data.copy()
+        return mesh
+
+    def transform(self, matrix):
+        (a, b, c, d), (e, f, g, h), (i, j, k, l) = matrix.rows[:3]
+        co = self.vertices.values["co"]
+        transformed = array("f", co)
+        for n in range(0, len(co), 3):
+            x, y, z = co[n], co[n + 1], co[n + 2]
+            transformed[n] = a*x + b*y + c*z + d
+            transformed[n + 1] = e*x + f*y + g*z + h
+            transformed[n + 2] = i*x + j*y + k*z + l
+        self.vertices.values["co"] = transformed
+
+    def calc_loop_triangles(self):  # fan triangulation of every polygon
+        vertexIndices = self.loops.values["vertex_index"]
+        triangles = array("i")
+        materialIndices = array("i")
+        polygonIndices = array("i")
+        polygons = self.polygons.values
+        for polygon, (start, total, materialIndex) in enumerate(zip(polygons["loop_start"],
+                                                                    polygons["loop_total"],
+                                                                    polygons["material_index"])):
+            for corner in range(1, total - 1):
+                triangles.extend((vertexIndices[start], vertexIndices[start + corner], vertexIndices[start + corner + 1]))
+                materialIndices.append(materialIndex)
+                polygonIndices.append(polygon)
+        self.loop_triangles.values = {"vertices": triangles,
+                                      "material_index": materialIndices,
+                                      "polygon_index": polygonIndices}
+        self.loop_triangles.count = len(materialIndices)
+
+    def update(self, calc_edges=False):
+        pass
+
+    def validate(self, verbose=False):
+        return False
+
+
+class CollisionValues(object):  # what BlenderCOL's CollisionProperties registers as Material.colEditor
+
+    def __init__(self):
+        self.colType = 0
+        self.terrainType = 0
+        self.UnknownField = 0
+        self.hasColParameterField = False
+        self.colParameterField = 0
+
+
+class Material(ID):
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.diffuse_color = (0.8, 0.8, 0.8, 1.0)
+        self.use_nodes = False
+        self.colEditor = CollisionValues()
+
+
+class MaterialSlot(bpy_struct):
+
+    def __init__(self, material):
+        self.material = material
+
+
+class Object(ID):
+
+    def __init__(self, name, data):
+        super().__init__(name)
+        self.data = data
+        self.type = "MESH" if isinstance(data, Mesh) else "EMPTY"
+        self.matrix_world = Matrix()
+        self.selected = False
+
+    @property
+    def material_slots(self):
+        return [MaterialSlot(material) for material in self.data.materials] if self.data is not None else []
+
+    def select_set(self, state):
+        self.selected = state
+
+    def evaluated_get(self, depsgraph):  # no modifiers, the object is its own evaluated version
+        return self
+
+    def to_mesh(self):
+        return self.data.copy()
+
+    def to_mesh_clear(self):
+        pass
+
+
+class IDCollection(list):
+
+    def __init__(self, factory):
+        super().__init__()
+        self.factory = factory
+
+    def new(self, name, *args):
+        block = self.factory(name, *args)
+        self.append(block)
+        return block
+
+    def get(self, name, default=None):
+        for block in self:
+            if block.name == name:
+                return block
+        return default
+
+
+class BlendData(object):
+
+    def __init__(self):
+        self.meshes = IDCollection(Mesh)
+        self.objects = IDCollection(Object)
+        self.materials = IDCollection(Material)
+        self.collections = IDCollection(Collection)
+        self.textures = IDCollection(ID)
+        self.images = IDCollection(ID)
+
+
+class CollectionObjects(list):
+
+    def link(self, obj):
+        self.append(obj)
+
+
+class Collection(ID):
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.objects = CollectionObjects()
+        self.children = CollectionObjects()
+
+    @property
+    def all_objects(self):
+        objects = list(self.objects)
+        for child in self.children:
+            objects.extend(child.all_objects)
+        return objects
+
+
+class Scene(bpy_struct):
+
+    def __init__(self):
+        self.collection = Collection("Scene Collection")
+
+    @property
+    def objects(self):
+        return self.collection.all_objects
+
+
+class LayerObjects(object):
+
+    def __init__(self):
+        self.active = None
+
+
+class ViewLayer(bpy_struct):
+
+    def __init__(self):
+        self.objects = LayerObjects()
+
+
+class Screen(bpy_struct):
+
+    def __init__(self):
+        self.areas = []
+
+
+class WindowManager(bpy_struct):
+
+    def __init__(self):
+        self.progress = None
+        self.windows = []
+
+    def progress_begin(self, minimum, maximum):
+        self.progress = minimum
+
+    def progress_update(self, value):
+        self.progress = value
+
+    def progress_end(self):
+        self.progress = None
+
+    def event_timer_add(self, time_step, window=None):
+        return object()
+
+    def event_timer_remove(self, timer):
+        pass
+
+    def modal_handler_add(self, operator):
+        return True
+
+
+class Depsgraph(bpy_struct):
+
+    def __init__(self):
+        self.updates = []
+
+
+class Context(bpy_struct):
+
+    def __init__(self, data):
+        self.blend_data = data
+        self.scene = Scene()
+        self.collection = self.scene.collection
+        self.view_layer = ViewLayer()
+        self.screen = Screen()
+        self.window_manager = WindowManager()
+        self.window = None
+        self.edit_object = None
+        self.material = None
+        self.object = None
+        self.mode = "OBJECT"
+
+    @property
+    def selected_objects(self):
+        return [obj for obj in self.scene.objects if obj.selected]
+
+    def evaluated_depsgraph_get(self):
+        return Depsgraph()
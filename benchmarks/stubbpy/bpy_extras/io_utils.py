@@ -0,0 +1,9 @@
+from bpy.props import StringProperty
+
+
+class ExportHelper:
+    filepath: StringProperty()
+
+
+class ImportHelper:
+    filepath: StringProperty()
@@ -0,0 +1,17 @@
+class Matrix(object):
+
+    def __init__(self, rows=((1, 0, 0, 0), (0, 1, 0, 0), (0, 0, 1, 0), (0, 0, 0, 1))):
+        self.rows = [tuple(float(value) for value in row) for row in rows]
+
+    def __matmul__(self, other):
+        columns = list(zip(*other.rows))
+        return Matrix([[sum(a*b for a, b in zip(row, column)) for column in columns] for row in self.rows])
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def __repr__(self):
+        return "Matrix(%r)" % (self.rows,)
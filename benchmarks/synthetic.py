@@ -0,0 +1,45 @@
+from colcodec import *
+import random
+
+
+def syntheticModel(triangleCount, groupCount=16, colParameterDensity=0.25, seed=0):
+    """Deterministic stage-like model.
+
+    Triangles form strips over a grid of vertices, so the vertex count stays
+    well below the triangle count like it does in real stages. Triangles are
+    spread over groupCount collision types, colParameterDensity is the share
+    of groups that carry a colParameter.
+    """
+    generator = random.Random(seed)
+    model = CollisionModel()
+
+    width = max(2, min(256, int((triangleCount/2)**0.5) + 1))
+    rows = max(2, min(MAX_VERTEX_COUNT//width, triangleCount//(2*(width - 1)) + 2))
+    for row in range(rows):
+        for column in range(width):
+            model.addVertex(column*100.0, generator.uniform(-50.0, 50.0), row*100.0)
+
+    colTypes = sorted(generator.sample(range(0x10000), groupCount))
+    hasColParameters = [generator.random() < colParameterDensity for _ in colTypes]
+    quadCount = (rows - 1)*(width - 1)
+    for index in range(triangleCount):
+        quad = (index//2) % quadCount
+        v = quad//(width - 1)*width + quad % (width - 1)
+        vertexIndices = (v, v + 1, v + width + 1) if index % 2 == 0 else (v, v + width + 1, v + width)
+        group = generator.randrange(groupCount)
+        colParameter = generator.choice((0, 8000, 10300, 27500)) if hasColParameters[group] else None
+        model.addTriangle(vertexIndices, colTypes[group], generator.randrange(32), generator.randrange(28), colParameter)
+    return model
+
+
+def flooredModel(model):  # copy of a model with one floor triangle under all of it, like real stages have
+    floored = CollisionModel(model.vertexIndices.typecode)
+    floored.extend(model)
+    minimum, maximum = modelBounds(model)
+    width = max(maximum[0] - minimum[0], maximum[2] - minimum[2], 1.0)
+    y = minimum[1] - 1.0
+    a = floored.addVertex(minimum[0] - 1.0, y, minimum[2] - 1.0)
+    b = floored.addVertex(minimum[0] + 3*width, y, minimum[2] - 1.0)
+    c = floored.addVertex(minimum[0] - 1.0, y, minimum[2] + 3*width)
+    floored.addTriangle((a, b, c), 0, 0, 0, None)
+    return floored
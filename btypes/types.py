@@ -1,4 +1,87 @@
 import struct as _struct
+from operator import attrgetter as _attrgetter
+
+try:
+    import numpy as _numpy
+except ImportError:
+    _numpy = None
+
+
+NUMPY_TYPES = {"?": "b1", "b": "i1", "B": "u1",
+               "h": "i2", "H": "u2",
+               "i": "i4", "I": "u4", "l": "i4", "L": "u4",
+               "q": "i8", "Q": "u8",
+               "e": "f2", "f": "f4", "d": "f8"}
+
+
+class Cursor:
+    """File-like position over a bytes, bytearray, memoryview or mmap buffer.
+
+    Every type reads and writes a Cursor in place with struct's unpack_from
+    and pack_into instead of going through read and write. Writing past the
+    end grows a bytearray and fails for anything else.
+    """
+
+    def __init__(self, buffer, position=0):
+        if isinstance(buffer, memoryview) and buffer.format != "B":
+            buffer = buffer.cast("B")
+        self.buffer = buffer
+        self.position = position
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.position
+        elif whence == 2:
+            offset += len(self.buffer)
+        self.position = offset
+        return offset
+
+    def take(self, size):  # -> offset of the next size bytes, skipping past them
+        offset = self.position
+        if offset + size > len(self.buffer):
+            raise EOFError("expected %d bytes at offset %d, buffer holds %d" % (size, offset, len(self.buffer)))
+        self.position = offset + size
+        return offset
+
+    def reserve(self, size):  # -> offset to write the next size bytes at
+        offset = self.position
+        end = offset + size
+        if end > len(self.buffer):
+            if not isinstance(self.buffer, bytearray):
+                raise ValueError("cannot write past the end of a %s" % type(self.buffer).__name__)
+            self.buffer.extend(bytes(end - len(self.buffer)))
+        self.position = end
+        return offset
+
+    def read(self, size=-1):
+        if size < 0:
+            size = max(0, len(self.buffer) - self.position)
+        data = bytes(self.buffer[self.position:self.position + size])
+        self.position += len(data)
+        return data
+
+    def write(self, data):
+        offset = self.reserve(len(data))
+        self.buffer[offset:self.position] = data
+        return len(data)
+
+    def find(self, sub, start=None, chunkSize=4096):  # -> offset of sub from start or the position on, -1 if missing
+        start = self.position if start is None else start
+        if not isinstance(self.buffer, memoryview):
+            return self.buffer.find(sub, start)
+        # memoryview can't search, look at one chunk at a time
+        while start < len(self.buffer):
+            index = bytes(self.buffer[start:start + chunkSize + len(sub) - 1]).find(sub)
+            if index >= 0:
+                return start + index
+            start += chunkSize
+        return -1
 
 
 class BasicType:
@@ -7,13 +90,19 @@ class BasicType:
         self.formatCharacter = formatCharacter
         self.endianess = endianess
         self.format_string = endianess + formatCharacter
-        self.size = _struct.calcsize(self.format_string)
+        self.codec = _struct.Struct(self.format_string)
+        self.size = self.codec.size
 
     def pack(self, stream, value):
-        stream.write(_struct.pack(self.format_string, value))
+        if type(stream) is Cursor:
+            self.codec.pack_into(stream.buffer, stream.reserve(self.size), value)
+            return
+        stream.write(self.codec.pack(value))
 
     def unpack(self, stream):
-        return _struct.unpack(self.format_string, stream.read(self.size))[0]
+        if type(stream) is Cursor:
+            return self.codec.unpack_from(stream.buffer, stream.take(self.size))[0]
+        return self.codec.unpack(stream.read(self.size))[0]
 
     def sizeof(self):
         return self.size
@@ -57,15 +146,28 @@ class Array:
     def __init__(self, elementType, length):
         self.elementType = elementType
         self.length = length
+        if isinstance(elementType, BasicType):  # all elements in one struct call
+            self.codec = _struct.Struct("%s%d%s" % (elementType.endianess, length, elementType.formatCharacter))
+        else:
+            self.codec = None
 
     def pack(self, stream, array):
         if len(array) != self.length:
             raise ValueError("wrong array length")
-        for value in array:
-            self.elementType.pack(stream, value)
+        if self.codec is None:
+            for value in array:
+                self.elementType.pack(stream, value)
+        elif type(stream) is Cursor:
+            self.codec.pack_into(stream.buffer, stream.reserve(self.codec.size), *array)
+        else:
+            stream.write(self.codec.pack(*array))
 
     def unpack(self, stream):
-        return [self.elementType.unpack(stream) for i in range(self.length)]
+        if self.codec is None:
+            return [self.elementType.unpack(stream) for i in range(self.length)]
+        if type(stream) is Cursor:
+            return list(self.codec.unpack_from(stream.buffer, stream.take(self.codec.size)))
+        return list(self.codec.unpack(stream.read(self.codec.size)))
 
     def sizeof(self):
         return self.length*self.elementType.sizeof()
@@ -82,10 +184,23 @@ class CString:
     def unpack(self, stream):
         # XXX: This might not work for all encodings
         null = "\0".encode(self.encoding)
-        string = b""
+        if type(stream) is Cursor:
+            start = index = stream.position
+            while True:
+                index = stream.find(null, index)
+                if index < 0:
+                    raise EOFError("unterminated string at offset %d" % start)
+                if (index - start) % len(null) == 0:
+                    break
+                index += 1  # the terminator has to start on a character boundary
+            string = bytes(stream.buffer[start:index])
+            stream.position = index + len(null)
+            return string.decode(self.encoding)
+
+        string = bytearray()
         while True:
             c = stream.read(len(null))
-            if c == null:
+            if c == null or len(c) < len(null):
                 break
             string += c
         return string.decode(self.encoding)
@@ -107,6 +222,9 @@ class PString:
 
     def unpack(self, stream):
         length = self.lengthType.unpack(stream)
+        if type(stream) is Cursor:
+            offset = stream.take(length)
+            return bytes(stream.buffer[offset:offset + length]).decode(self.encoding)
         return stream.read(length).decode(self.encoding)
 
     def sizeof(self):
@@ -151,6 +269,95 @@ class Padding(object):
         return True
 
 
+class StructCodec:
+    """Precompiled struct.Struct covering every field of a fixed-size Struct.
+
+    Only structs made of BasicType fields sharing one endianess, plus Padding,
+    can be compiled. Zero padding maps to "x" pad bytes, any other padding is
+    packed as a constant "s" field and dropped again when unpacking.
+    """
+
+    def __init__(self, structFields):
+        endianess = None
+        formats = []
+        self.names = []
+        self.paddingValues = []  # (value index, padding bytes)
+        self.valueIndices = []  # value index of each named field
+        self.paddingRanges = []  # (offset, padding bytes) of every Padding
+        self.numpyFields = []  # (name, numpy type, offset) of every named field
+        offset = 0
+
+        for field in structFields:
+            if isinstance(field, Padding):
+                padding = (field.padding*field.length)[:field.length]
+                self.paddingRanges.append((offset, padding))
+                offset += field.length
+                if padding == bytes(field.length):
+                    formats.append("%dx" % field.length)
+                else:
+                    self.paddingValues.append((len(self.valueIndices) + len(self.paddingValues), padding))
+                    formats.append("%ds" % field.length)
+                continue
+            if not (isinstance(field, Field) and isinstance(field.fieldType, BasicType)):
+                raise TypeError("field %r cannot be compiled" % getattr(field, "name", field))
+            if endianess is None:
+                endianess = field.fieldType.endianess
+            elif endianess != field.fieldType.endianess:
+                raise TypeError("fields with mixed endianess cannot be compiled")
+            self.valueIndices.append(len(self.valueIndices) + len(self.paddingValues))
+            self.names.append(field.name)
+            formats.append(field.fieldType.formatCharacter)
+            self.numpyFields.append((field.name, NUMPY_TYPES.get(field.fieldType.formatCharacter), offset))
+            offset += field.fieldType.size
+
+        self.endianess = endianess or "="
+        self.codec = _struct.Struct(self.endianess + "".join(formats))
+        self.size = self.codec.size
+
+        if len(self.names) == 0:
+            self.getValues = lambda struct: ()
+        elif len(self.names) == 1:
+            getter = _attrgetter(self.names[0])
+            self.getValues = lambda struct: (getter(struct),)
+        else:
+            self.getValues = _attrgetter(*self.names)
+
+    def values(self, struct):
+        values = self.getValues(struct)
+        if self.paddingValues:
+            values = list(values)
+            for index, padding in self.paddingValues:
+                values.insert(index, padding)
+        return values
+
+    def assign(self, struct, values):
+        if self.paddingValues:
+            values = [values[i] for i in self.valueIndices]
+        for name, value in zip(self.names, values):
+            setattr(struct, name, value)
+        return struct
+
+    def pack(self, struct):
+        return self.codec.pack(*self.values(struct))
+
+    def pack_into(self, buffer, offset, struct):
+        self.codec.pack_into(buffer, offset, *self.values(struct))
+
+    def unpack(self, data, struct):
+        return self.assign(struct, self.codec.unpack(data))
+
+    def unpack_from(self, buffer, offset, struct):
+        return self.assign(struct, self.codec.unpack_from(buffer, offset))
+
+    def dtype(self):  # numpy structured dtype with the same layout, padding left as gaps
+        if _numpy is None or any(numpyType is None for name, numpyType, offset in self.numpyFields):
+            return None
+        return _numpy.dtype({"names": [name for name, numpyType, offset in self.numpyFields],
+                             "formats": [self.endianess + numpyType for name, numpyType, offset in self.numpyFields],
+                             "offsets": [offset for name, numpyType, offset in self.numpyFields],
+                             "itemsize": self.size})
+
+
 class StructClassDictionary(dict):
 
     def __init__(self):
@@ -179,9 +386,16 @@ class StructMetaClass(type):
             structSize = sum(field.sizeof()
                               for field in classdict.structFields)
 
+        try:
+            structCodec = StructCodec(classdict.structFields)
+        except TypeError:
+            structCodec = None
+
         structClass = type.__new__(metacls, cls, bases, classdict)
         structClass.structFields = classdict.structFields
         structClass.structSize = structSize
+        structClass.structCodec = structCodec
+        structClass.structDtype = structCodec.dtype() if structCodec is not None else None
         return structClass
 
     def __init__(self, cls, bases, classdict):
@@ -197,6 +411,12 @@ class Struct(metaclass=StructMetaClass):
 
     @classmethod
     def pack(cls, stream, struct):
+        if cls.structCodec is not None:
+            if type(stream) is Cursor:
+                cls.structCodec.pack_into(stream.buffer, stream.reserve(cls.structCodec.size), struct)
+            else:
+                stream.write(cls.structCodec.pack(struct))
+            return
         for field in cls.structFields:
             field.pack(stream, struct)
 
@@ -204,10 +424,53 @@ class Struct(metaclass=StructMetaClass):
     def unpack(cls, stream):
         # TODO: what if __init__ does something important?
         struct = cls.__new__(cls)
+        if cls.structCodec is not None:
+            if type(stream) is Cursor:
+                return cls.structCodec.unpack_from(stream.buffer, stream.take(cls.structCodec.size), struct)
+            return cls.structCodec.unpack(stream.read(cls.structCodec.size), struct)
         for field in cls.structFields:
             field.unpack(stream, struct)
         return struct
 
+    @classmethod
+    def pack_into(cls, buffer, offset, struct):
+        if cls.structCodec is not None:
+            cls.structCodec.pack_into(buffer, offset, struct)
+            return
+        cls.pack(Cursor(buffer, offset), struct)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0):
+        if cls.structCodec is not None:
+            return cls.structCodec.unpack_from(buffer, offset, cls.__new__(cls))
+        return cls.unpack(Cursor(buffer, offset))
+
+    @classmethod
+    def read_array(cls, stream, count):  # -> numpy record array of count structs
+        dtype = cls.arrayDtype()
+        data = stream.read(count*dtype.itemsize)
+        if len(data) != count*dtype.itemsize:
+            raise ValueError("expected %d bytes, got %d" % (count*dtype.itemsize, len(data)))
+        return _numpy.frombuffer(bytearray(data), dtype)
+
+    @classmethod
+    def write_array(cls, stream, array):
+        dtype = cls.arrayDtype()
+        records = _numpy.array(array, dtype, copy=True, ndmin=1)
+        if cls.structCodec.paddingRanges:
+            raw = records.view(_numpy.uint8).reshape(len(records), dtype.itemsize)
+            for offset, padding in cls.structCodec.paddingRanges:
+                raw[:, offset:offset + len(padding)] = _numpy.frombuffer(padding, _numpy.uint8)
+        stream.write(records.tobytes())
+
+    @classmethod
+    def arrayDtype(cls):
+        if cls.structDtype is None:
+            if _numpy is None:
+                raise ImportError("numpy is required for struct arrays")
+            raise TypeError("%s has no numpy dtype" % cls.__name__)
+        return cls.structDtype
+
     @classmethod
     def sizeof(cls):
         return cls.structSize
@@ -0,0 +1,15 @@
+"""Reading and writing Super Mario Sunshine collision (COL) files.
+
+Nothing in this package depends on blender, the BlenderCOL add-on builds on it
+and so does the command line tool (python -m colcodec).
+"""
+
+from colcodec.profiling import *
+from colcodec.model import *
+from colcodec.yaz0 import *
+from colcodec.reader import *
+from colcodec.catalog import *
+from colcodec.geometry import *
+from colcodec.validate import *
+from colcodec.export import *
+from colcodec.convert import *
@@ -0,0 +1,6 @@
+import sys
+
+from colcodec.cli import main
+
+
+sys.exit(main())
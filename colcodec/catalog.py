@@ -0,0 +1,216 @@
+from colcodec.model import *
+from colcodec.yaz0 import *
+from collections import Counter
+import io
+import json
+import os
+
+
+CATALOG_VERSION = 1
+
+
+class GroupSummary(object):
+
+    def __init__(self, colType, triangleCount, hasColParameter, terrainTypes=None, unknowns=None):
+        self.colType = colType
+        self.triangleCount = triangleCount
+        self.hasColParameter = hasColParameter
+        self.terrainTypes = terrainTypes  # {terrainType: triangles}, None without histograms
+        self.unknowns = unknowns  # {unknown: triangles}, None without histograms
+
+    def toDict(self):
+        values = {"colType": self.colType,
+                  "triangleCount": self.triangleCount,
+                  "hasColParameter": self.hasColParameter}
+        if self.terrainTypes is not None:
+            values["terrainTypes"] = {str(value): count for value, count in self.terrainTypes.items()}
+            values["unknowns"] = {str(value): count for value, count in self.unknowns.items()}
+        return values
+
+    @classmethod
+    def fromDict(cls, values):
+        histograms = [None if name not in values else {int(value): count for value, count in values[name].items()}
+                      for name in ("terrainTypes", "unknowns")]
+        return cls(values["colType"], values["triangleCount"], values["hasColParameter"], *histograms)
+
+
+class CatalogEntry(object):
+    """What the catalog knows about one COL file, read from its Header and Group table."""
+
+    def __init__(self, path, size, mtime, compressed, vertexCount, groups):
+        self.path = path
+        self.size = size
+        self.mtime = mtime  # st_mtime_ns
+        self.compressed = compressed
+        self.vertexCount = vertexCount
+        self.groups = groups
+
+    @property
+    def triangleCount(self):
+        return sum(group.triangleCount for group in self.groups)
+
+    @property
+    def colTypes(self):
+        return sorted(set(group.colType for group in self.groups))
+
+    @property
+    def hasHistograms(self):
+        return all(group.terrainTypes is not None for group in self.groups)
+
+    def terrainTypes(self):  # -> Counter of terrainType over the whole file
+        counts = Counter()
+        for group in self.groups:
+            counts.update(group.terrainTypes)
+        return counts
+
+    def unknowns(self):  # -> Counter of unknown over the whole file
+        counts = Counter()
+        for group in self.groups:
+            counts.update(group.unknowns)
+        return counts
+
+    def isCurrent(self, stat):
+        return self.size == stat.st_size and self.mtime == stat.st_mtime_ns
+
+    def toDict(self):
+        return {"size": self.size,
+                "mtime": self.mtime,
+                "compressed": self.compressed,
+                "vertexCount": self.vertexCount,
+                "groups": [group.toDict() for group in self.groups]}
+
+    @classmethod
+    def fromDict(cls, path, values):
+        return cls(path, values["size"], values["mtime"], values["compressed"], values["vertexCount"],
+                   [GroupSummary.fromDict(group) for group in values["groups"]])
+
+
+def readEntry(filepath, histograms=False, stat=None):  # -> CatalogEntry, reading as little of the file as it can
+    stat = os.stat(filepath) if stat is None else stat
+    with open(filepath, "rb") as stream:
+        compressed = stream.read(4) == YAZ0_MAGIC
+        stream.seek(0)
+        if compressed:  # only decompress as far as the tables, unless the histograms need the whole file
+            data = stream.read()
+            header = Header.unpack(io.BytesIO(decompress(data, Header.sizeof())))
+            tablesEnd = header.groupOffset + Group.sizeof()*header.groupCount
+            stream = io.BytesIO(decompress(data) if histograms else decompress(data, tablesEnd))
+            size = len(stream.getbuffer())
+        else:
+            header = Header.unpack(stream)
+            size = stat.st_size
+        if header.groupOffset + Group.sizeof()*header.groupCount > size:
+            raise FormatError("group table runs past the end of the file")
+
+        stream.seek(header.groupOffset)
+        records = [Group.unpack(stream) for i in range(header.groupCount)]
+        groups = []
+        for record in records:
+            group = GroupSummary(record.collisionType, record.triangleCount, bool(record.hasColParameter))
+            if histograms:
+                group.terrainTypes = dict(Counter(readSection(stream, record.terrainTypeOffset, record.triangleCount)))
+                group.unknowns = dict(Counter(readSection(stream, record.unknownOffset, record.triangleCount)))
+            groups.append(group)
+    return CatalogEntry(filepath, stat.st_size, stat.st_mtime_ns, compressed, header.vertexCount, groups)
+
+
+def readSection(stream, offset, size):
+    stream.seek(offset)
+    data = stream.read(size)
+    if len(data) != size:
+        raise FormatError("section at 0x%X runs past the end of the file" % offset)
+    return data
+
+
+def colFiles(paths):  # COL files given directly plus the ones under given directories
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, directoryNames, fileNames in os.walk(path):
+            directoryNames.sort()
+            for fileName in sorted(fileNames):
+                if fileName.lower().endswith(".col"):
+                    yield os.path.join(directory, fileName)
+
+
+class Catalog(object):
+    """Persistent index of the Header and Group table of many COL files.
+
+    Entries are keyed on absolute paths and reused by update() for as long as
+    the size and modification time of their file stay the same, so a warm
+    update only has to stat the files. With histograms every group also
+    counts its terrainType and unknown values, which takes reading those
+    sections (and decompressing Yaz0 files completely).
+    """
+
+    def __init__(self, filepath=None, histograms=False):
+        self.filepath = filepath
+        self.histograms = histograms
+        self.entries = {}  # absolute path -> CatalogEntry
+
+    def load(self):  # a missing, unreadable or outdated index is an empty one, an index with histograms keeps them
+        if self.filepath is None:
+            return
+        try:
+            with open(self.filepath, "r") as stream:
+                values = json.load(stream)
+            if values.get("version") != CATALOG_VERSION:
+                return
+            self.histograms = self.histograms or values["histograms"]
+            self.entries = {path: CatalogEntry.fromDict(path, entry) for path, entry in values["files"].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            self.entries = {}
+
+    def save(self):
+        values = {"version": CATALOG_VERSION,
+                  "histograms": self.histograms,
+                  "files": {path: entry.toDict() for path, entry in sorted(self.entries.items())}}
+        temporaryPath = self.filepath + ".tmp"
+        with open(temporaryPath, "w") as stream:
+            json.dump(values, stream, separators=(",", ":"))
+        os.replace(temporaryPath, self.filepath)
+
+    def update(self, paths):  # -> (entries read, entries reused, [(path, error)]), and forgets files that are gone
+        read = 0
+        reused = 0
+        failures = []
+        for filepath in colFiles(paths):
+            path = os.path.abspath(filepath)
+            try:
+                stat = os.stat(path)
+                entry = self.entries.get(path)
+                if entry is not None and entry.isCurrent(stat) and (entry.hasHistograms or not self.histograms):
+                    reused += 1
+                    continue
+                self.entries[path] = readEntry(path, self.histograms, stat)
+                read += 1
+            except Exception as error:
+                self.entries.pop(path, None)
+                failures.append((filepath, error))
+        for path in [path for path in self.entries if not os.path.exists(path)]:
+            del self.entries[path]
+        return read, reused, failures
+
+    def query(self, colType=None, terrainType=None, unknown=None, minVertexCount=None):  # -> entries matching every given value, by path
+        needsHistograms = terrainType is not None or unknown is not None
+        matches = []
+        for path, entry in sorted(self.entries.items()):
+            if needsHistograms and not entry.hasHistograms:
+                raise ValueError("%s was cataloged without histograms" % path)
+            if colType is not None and colType not in entry.colTypes:
+                continue
+            if terrainType is not None and terrainType not in entry.terrainTypes():
+                continue
+            if unknown is not None and unknown not in entry.unknowns():
+                continue
+            if minVertexCount is not None and entry.vertexCount < minVertexCount:
+                continue
+            matches.append(entry)
+        return matches
+
+    def withColType(self, colType):
+        return self.query(colType=colType)
+
+    def nearVertexLimit(self, fraction=0.9):  # files using at least fraction of the vertices a col file can index
+        return self.query(minVertexCount=int(fraction*MAX_VERTEX_COUNT))
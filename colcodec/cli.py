@@ -0,0 +1,167 @@
+from colcodec.convert import *
+from colcodec.validate import *
+from colcodec.catalog import *
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import os
+import sys
+
+
+def findFiles(paths, extensions):  # files given directly plus matching files under given directories
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path, os.path.basename(path)
+            continue
+        for directory, directoryNames, fileNames in os.walk(path):
+            directoryNames.sort()
+            for fileName in sorted(fileNames):
+                if formatOf(fileName) in extensions:
+                    filepath = os.path.join(directory, fileName)
+                    yield filepath, os.path.relpath(filepath, path)
+
+
+def runJobs(function, jobs, workers):  # -> [(arguments, result, error)], spread over a process pool
+    if workers == 1 or len(jobs) < 2:
+        results = []
+        for arguments in jobs:
+            try:
+                results.append((arguments, function(*arguments), None))
+            except Exception as error:
+                results.append((arguments, None, error))
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [(arguments, executor.submit(function, *arguments)) for arguments in jobs]
+        results = []
+        for arguments, future in futures:
+            try:
+                results.append((arguments, future.result(), None))
+            except Exception as error:
+                results.append((arguments, None, error))
+        return results
+
+
+def convert(args):
+    jobs = []
+    for source, relativePath in findFiles(args.paths, (args.source,)):
+        destination = os.path.splitext(relativePath if args.output else source)[0] + "." + args.target
+        if args.output:
+            destination = os.path.join(args.output, destination)
+        jobs.append((source, destination, args.yaz0_level if args.yaz0 else None, args.morton))
+
+    failures = 0
+    for (source, destination, compressLevel, spatialOrder), written, error in runJobs(convertFile, jobs, args.jobs):
+        if error is not None:
+            failures += 1
+            print("%s: %s" % (source, error), file=sys.stderr)
+        elif not args.quiet:
+            print("%s -> %s" % (source, ", ".join(written)))
+    if not args.quiet:
+        print("%d converted, %d failed" % (len(jobs) - failures, failures))
+    return 1 if failures else 0
+
+
+def validateFile(filepath, tolerance, sliverRatio):  # module level so process pools can pickle it
+    return validateModel(readModel(filepath), tolerance, sliverRatio)
+
+
+def validate(args):
+    jobs = [(source, args.tolerance, args.sliver_ratio) for source, relativePath in findFiles(args.paths, FORMATS)]
+
+    failures = 0
+    problems = 0
+    for (source, tolerance, sliverRatio), validation, error in runJobs(validateFile, jobs, args.jobs):
+        if error is not None:
+            failures += 1
+            print("%s: %s" % (source, error), file=sys.stderr)
+            continue
+        if not validation.ok:
+            problems += 1
+        if not validation.ok or not args.quiet:
+            print("%s: %s" % (source, validation.summary()))
+        if args.verbose:
+            for diagnostic in validation.diagnostics:
+                print("    %s" % diagnostic)
+    if not args.quiet:
+        print("%d valid, %d with problems, %d failed" % (len(jobs) - problems - failures, problems, failures))
+    return 1 if problems or failures else 0
+
+
+def catalog(args):
+    index = Catalog(args.index, args.histograms)
+    index.load()
+    read, reused, failures = index.update(args.paths)
+    index.save()
+    for source, error in failures:
+        print("%s: %s" % (source, error), file=sys.stderr)
+
+    queried = args.col_type is not None or args.terrain_type is not None or args.unknown is not None or \
+        args.near_limit is not None
+    if queried:
+        try:
+            entries = index.query(args.col_type, args.terrain_type, args.unknown,
+                                  None if args.near_limit is None else int(args.near_limit*MAX_VERTEX_COUNT))
+        except ValueError as error:
+            print("%s, catalog again with --histograms" % error, file=sys.stderr)
+            return 1
+        for entry in entries:
+            print("%s: %d vertices, %d triangles, colTypes %s" % (entry.path, entry.vertexCount, entry.triangleCount,
+                                                                 " ".join("0x%04X" % colType for colType in entry.colTypes)))
+    if not args.quiet:
+        print("%d files in the catalog, %d read, %d unchanged, %d failed" % (len(index.entries), read, reused, len(failures)),
+              file=sys.stderr if queried else sys.stdout)
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m colcodec",
+                                     description="Batch tools for Super Mario Sunshine collision files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("convert", help="convert between COL, OBJ and PLY, or re-encode COL files",
+                                  description="Convert files or whole directories. Converting COL to COL "
+                                              "re-encodes the files, regrouping their triangles.")
+    command.add_argument("paths", nargs="+", help="files, or directories searched for files of the source format")
+    command.add_argument("-f", "--from", dest="source", choices=FORMATS, default="col", help="source format (default: col)")
+    command.add_argument("-t", "--to", dest="target", choices=FORMATS, default="col", help="target format (default: col)")
+    command.add_argument("-o", "--output", help="output directory, the directory layout is kept (default: next to the source)")
+    command.add_argument("-z", "--yaz0", action="store_true", help="Yaz0 compress COL output")
+    command.add_argument("--yaz0-level", type=int, default=DEFAULT_LEVEL, choices=sorted(LEVELS), metavar="LEVEL",
+                         help="compression level with --yaz0, 0 (fastest) to 9 (smallest) (default: %d)" % DEFAULT_LEVEL)
+    command.add_argument("-m", "--morton", action="store_true",
+                         help="lay out COL vertices and triangles in Morton (Z-order) order, for better locality")
+    command.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    command.add_argument("-q", "--quiet", action="store_true", help="only report failures")
+    command.set_defaults(function=convert)
+
+    command = commands.add_parser("validate", help="find broken triangles in COL, OBJ and PLY files",
+                                  description="Report out of range, degenerate, non-finite, duplicate, sliver and "
+                                              "overlapping coplanar triangles. Exits with status 1 if any file has problems.")
+    command.add_argument("paths", nargs="+", help="files, or directories searched for COL, OBJ and PLY files")
+    command.add_argument("--tolerance", type=float, default=0.001,
+                         help="distance under which coplanar triangles count as overlapping (default: 0.001)")
+    command.add_argument("--sliver-ratio", type=float, default=0.001,
+                         help="height to longest edge ratio under which a triangle is a sliver (default: 0.001)")
+    command.add_argument("-v", "--verbose", action="store_true", help="list every problem triangle")
+    command.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    command.add_argument("-q", "--quiet", action="store_true", help="only report files with problems")
+    command.set_defaults(function=validate)
+
+    command = commands.add_parser("catalog", help="index the headers of COL files and search them",
+                                  description="Keep an index of the Header and Group table of COL files, only files "
+                                              "whose size or modification time changed are read again. Files matching "
+                                              "every given query option are listed.")
+    command.add_argument("paths", nargs="+", help="files, or directories searched for COL files")
+    command.add_argument("-i", "--index", default="colcatalog.json", help="index file (default: colcatalog.json)")
+    command.add_argument("--histograms", action="store_true",
+                         help="also count the terrainType and unknown values of every group, needed to query them")
+    command.add_argument("-c", "--col-type", type=lambda value: int(value, 0), help="files with a group of this colType")
+    command.add_argument("--terrain-type", type=lambda value: int(value, 0), help="files with triangles of this terrainType")
+    command.add_argument("--unknown", type=lambda value: int(value, 0), help="files with triangles of this unknown value")
+    command.add_argument("--near-limit", type=float, nargs="?", const=0.9, metavar="FRACTION",
+                         help="files using at least FRACTION of the %d vertices a COL file can index (default: 0.9)" % MAX_VERTEX_COUNT)
+    command.add_argument("-q", "--quiet", action="store_true", help="only report failures and matches")
+    command.set_defaults(function=catalog)
+
+    args = parser.parse_args(argv)
+    return args.function(args)
@@ -0,0 +1,248 @@
+from colcodec.model import *
+from colcodec.export import *
+from colcodec.yaz0 import *
+import io
+import os
+import struct
+
+
+FORMATS = ("col", "obj", "ply")
+
+
+def materialName(attributes):  # same "colType,terrainType,unknown,colParameter" names the add-on gives materials
+    return "%d,%d,%d,%s" % attributes
+
+
+def parseMaterialName(name):  # -> (colType, terrainType, unknown, colParameter), zeros if name isn't one of ours
+    try:
+        colType, terrainType, unknown, colParameter = name.split(",")
+        return (int(colType), int(terrainType), int(unknown),
+                None if colParameter == "None" else int(colParameter))
+    except ValueError:
+        return 0, 0, 0, None
+
+
+def writeOBJ(stream, model):  # text stream, coordinates are written as they are in the col file (y up)
+    stream.write("# Super Mario Sunshine collision\n")
+    vertices = iter(model.vertices)
+    stream.writelines("v %r %r %r\n" % vertex for vertex in zip(vertices, vertices, vertices))
+    for group in groupTriangles(model):
+        attributes = {}  # triangles of a group can still differ in their other values
+        for index in group.triangles:
+            attributes.setdefault(model.attributes(index), []).append(index)
+        for key, triangles in attributes.items():
+            stream.write("usemtl %s\n" % materialName(key))
+            indices = iter(gather(model.vertexIndices, triangles, 3))
+            stream.writelines("f %d %d %d\n" % (a + 1, b + 1, c + 1) for a, b, c in zip(indices, indices, indices))
+
+
+def readOBJ(stream):  # text stream, polygons are fan triangulated, materials named like ours carry collision values
+    model = CollisionModel("I")
+    attributes = (0, 0, 0, None)
+    for line in stream:
+        words = line.split()
+        if not words:
+            continue
+        if words[0] == "v":
+            model.addVertex(float(words[1]), float(words[2]), float(words[3]))
+        elif words[0] == "f":
+            vertexCount = model.vertexCount
+            corners = []
+            for word in words[1:]:
+                index = int(word.split("/")[0])
+                corners.append(index - 1 if index > 0 else vertexCount + index)
+            for i in range(1, len(corners) - 1):
+                model.addTriangle((corners[0], corners[i], corners[i + 1]), *attributes)
+        elif words[0] == "usemtl":
+            attributes = parseMaterialName(line.split(None, 1)[1].strip() if len(words) > 1 else "")
+    return model
+
+
+PLY_FACE_PROPERTIES = (("col_type", "ushort"),
+                       ("terrain_type", "uchar"),
+                       ("unknown", "uchar"),
+                       ("col_parameter", "ushort"),
+                       ("has_col_parameter", "uchar"))
+
+PLY_TYPES = {"char": "b", "int8": "b",
+             "uchar": "B", "uint8": "B",
+             "short": "h", "int16": "h",
+             "ushort": "H", "uint16": "H",
+             "int": "i", "int32": "i",
+             "uint": "I", "uint32": "I",
+             "float": "f", "float32": "f",
+             "double": "d", "float64": "d"}
+
+
+def writePLY(stream, model):  # binary little endian with the collision values as face properties
+    header = ["ply",
+              "format binary_little_endian 1.0",
+              "comment Super Mario Sunshine collision",
+              "element vertex %d" % model.vertexCount,
+              "property float x",
+              "property float y",
+              "property float z",
+              "element face %d" % model.triangleCount,
+              "property list uchar int vertex_indices"]
+    header.extend("property %s %s" % (plyType, name) for name, plyType in PLY_FACE_PROPERTIES)
+    header.append("end_header")
+    stream.write(("\n".join(header) + "\n").encode("ascii"))
+
+    vertices = array("f", model.vertices)
+    if sys.byteorder == "big":
+        vertices.byteswap()
+    stream.write(vertices.tobytes())
+
+    face = struct.Struct("<B3iHBBHB")
+    indices = iter(model.vertexIndices)
+    stream.write(b"".join(face.pack(3, a, b, c, *attributes) for (a, b, c), attributes in
+                          zip(zip(indices, indices, indices),
+                              zip(model.colTypes, model.terrainTypes, model.unknowns,
+                                  model.colParameters, model.hasColParameters))))
+
+
+class PLYElement(object):
+
+    def __init__(self, name, count):
+        self.name = name
+        self.count = count
+        self.properties = []  # (name, format character, list length format character or None)
+
+
+def readPLYHeader(stream):  # -> (format, elements)
+    if stream.readline().strip() != b"ply":
+        raise FormatError("not a PLY file")
+    plyFormat = None
+    elements = []
+    while True:
+        line = stream.readline()
+        if not line:
+            raise FormatError("unexpected end of PLY header")
+        words = line.decode("ascii").split()
+        if not words or words[0] in ("comment", "obj_info"):
+            continue
+        if words[0] == "end_header":
+            return plyFormat, elements
+        if words[0] == "format":
+            plyFormat = words[1]
+        elif words[0] == "element":
+            elements.append(PLYElement(words[1], int(words[2])))
+        elif words[0] == "property":
+            if words[1] == "list":
+                elements[-1].properties.append((words[4], PLY_TYPES[words[3]], PLY_TYPES[words[2]]))
+            else:
+                elements[-1].properties.append((words[2], PLY_TYPES[words[1]], None))
+
+
+def readPLYElement(stream, plyFormat, element):  # -> list of {property name: value}
+    names = [name for name, formatCharacter, lengthFormat in element.properties]
+    if plyFormat == "ascii":
+        items = []
+        for _ in range(element.count):
+            words = iter(stream.readline().split())
+            item = {}
+            for name, formatCharacter, lengthFormat in element.properties:
+                convert = float if formatCharacter in "fd" else int
+                if lengthFormat is None:
+                    item[name] = convert(next(words))
+                else:
+                    item[name] = [convert(next(words)) for _ in range(int(next(words)))]
+            items.append(item)
+        return items
+
+    endianess = "<" if plyFormat == "binary_little_endian" else ">"
+    if all(lengthFormat is None for name, formatCharacter, lengthFormat in element.properties):
+        # fixed-size items decode in a single call
+        record = struct.Struct(endianess + "".join(formatCharacter for name, formatCharacter, lengthFormat in element.properties))
+        data = stream.read(record.size*element.count)
+        if len(data) != record.size*element.count:
+            raise FormatError("unexpected end of PLY file")
+        return [dict(zip(names, values)) for values in record.iter_unpack(data)]
+
+    items = []
+    for _ in range(element.count):
+        item = {}
+        for name, formatCharacter, lengthFormat in element.properties:
+            if lengthFormat is None:
+                value = struct.Struct(endianess + formatCharacter)
+                item[name] = value.unpack(stream.read(value.size))[0]
+            else:
+                length = struct.Struct(endianess + lengthFormat)
+                count = length.unpack(stream.read(length.size))[0]
+                values = struct.Struct(endianess + str(count) + formatCharacter)
+                item[name] = list(values.unpack(stream.read(values.size)))
+        items.append(item)
+    return items
+
+
+def readPLY(stream):  # binary stream, faces are fan triangulated
+    plyFormat, elements = readPLYHeader(stream)
+    model = CollisionModel("I")
+    for element in elements:
+        items = readPLYElement(stream, plyFormat, element)
+        if element.name == "vertex":
+            for item in items:
+                model.addVertex(item["x"], item["y"], item["z"])
+        elif element.name == "face":
+            for item in items:
+                corners = item.get("vertex_indices", item.get("vertex_index", []))
+                colParameter = item.get("col_parameter", 0) if item.get("has_col_parameter", 0) else None
+                attributes = (item.get("col_type", 0), item.get("terrain_type", 0), item.get("unknown", 0), colParameter)
+                for i in range(1, len(corners) - 1):
+                    model.addTriangle((corners[0], corners[i], corners[i + 1]), *attributes)
+    return model
+
+
+def formatOf(filepath):
+    return os.path.splitext(filepath)[1][1:].lower()
+
+
+def readModel(filepath):
+    fileFormat = formatOf(filepath)
+    if fileFormat == "col":
+        with openCOL(filepath) as stream:
+            return unpack(stream)
+    if fileFormat == "obj":
+        with open(filepath, "r") as stream:
+            return readOBJ(stream)
+    if fileFormat == "ply":
+        with open(filepath, "rb") as stream:
+            return readPLY(stream)
+    raise ValueError("unsupported format: %s" % filepath)
+
+
+def modelFiles(filepath, model, compressLevel=None, spatialOrder=False):  # (path, data) of every file a model is written as
+    fileFormat = formatOf(filepath)
+    if fileFormat == "col":
+        chunks = partitionModel(model) if model.vertexCount > MAX_VERTEX_COUNT else [model]  # split like the exporter does
+        if spatialOrder:
+            chunks = [mortonOrder(chunk) for chunk in chunks]
+        if len(chunks) > 1:
+            files = chunkFiles(filepath, chunks)
+        else:
+            files = [(filepath, encode(chunks[0]))]
+        if compressLevel is None:
+            return files
+        return [(path, compress(data, compressLevel) if formatOf(path) == "col" else data) for path, data in files]
+    if fileFormat == "obj":
+        stream = io.StringIO()
+        writeOBJ(stream, model)
+        return [(filepath, stream.getvalue().encode("utf-8"))]
+    if fileFormat == "ply":
+        stream = io.BytesIO()
+        writePLY(stream, model)
+        return [(filepath, stream.getvalue())]
+    raise ValueError("unsupported format: %s" % filepath)
+
+
+def convertFile(source, destination, compressLevel=None, spatialOrder=False):  # -> paths written, module level so process pools can pickle it
+    files = modelFiles(destination, readModel(source), compressLevel, spatialOrder)
+    directory = os.path.dirname(destination)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    stale = staleFiles(destination, files) if formatOf(destination) == "col" else []
+    for path, data in files:
+        writeFile(path, data)
+    for path in stale:
+        os.remove(path)
+    return [path for path, data in files]
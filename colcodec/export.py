@@ -0,0 +1,240 @@
+from colcodec.model import *
+from colcodec.geometry import *
+from colcodec.validate import *
+from colcodec.yaz0 import *
+import threading
+import io
+import json
+import os
+import sys
+
+
+def chunkFiles(filepath, chunks, profile=NULL_PROFILE, progress=None):  # (path, data) of each chunk file next to filepath plus a manifest
+    base, extension = os.path.splitext(filepath)
+    files = []
+    entries = []
+    for i, chunk in enumerate(chunks):
+        chunkPath = "%s_%d%s" % (base, i, extension)
+        chunkProgress = None if progress is None else lambda fraction: progress((i + fraction)/len(chunks))
+        files.append((chunkPath, encode(chunk, profile, chunkProgress)))
+        minimum, maximum = modelBounds(chunk)
+        entries.append({"file": os.path.basename(chunkPath),
+                        "min": list(minimum),
+                        "max": list(maximum),
+                        "vertexCount": chunk.vertexCount,
+                        "triangleCount": chunk.triangleCount})
+
+    manifest = json.dumps({"chunks": entries}, indent=4)
+    files.append((base + ".json", manifest.encode("utf-8")))
+    return files
+
+
+def writeFile(filepath, data):  # write through a temporary file so readers never see a partial file
+    temporaryPath = filepath + ".tmp"
+    with open(temporaryPath, "wb") as stream:
+        stream.write(data)
+    os.replace(temporaryPath, filepath)
+
+
+def staleFiles(filepath, files):  # outputs of an earlier export to filepath that files doesn't replace
+    base, extension = os.path.splitext(filepath)
+    directory, name = os.path.split(base)
+    candidates = [filepath]
+    try:
+        with open(base + ".json", "r") as stream:
+            entries = json.load(stream)["chunks"]
+        candidates.append(base + ".json")
+        for entry in entries:  # only chunk files named like ours
+            chunkName, chunkExtension = os.path.splitext(entry["file"])
+            if chunkName.startswith(name + "_") and chunkName[len(name) + 1:].isdigit() and chunkExtension == extension:
+                candidates.append(os.path.join(directory, entry["file"]))
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):  # no manifest of ours
+        pass
+    written = set(path for path, data in files)
+    return [path for path in candidates if path not in written and os.path.isfile(path)]
+
+
+class ExportCancelled(Exception): pass
+
+
+class ExportJob(threading.Thread):
+    """Welds, groups, encodes and writes an extracted model.
+
+    The job only touches the model it was given, so it can run on a worker
+    thread while blender keeps going. progress goes from 0 to 1, cancel()
+    stops the job before anything is written, the long phases check for it
+    through their progress callbacks. Files are only replaced once
+    everything has been encoded, then the files of an earlier export to the
+    same path that weren't replaced (a single col file where chunks are
+    written now, or the other way around) are removed. With a compressLevel the col files are
+    written Yaz0 compressed, with validate the welded model is checked and
+    the result kept in validation. With spatialOrder the vertices and
+    triangles of every col file are laid out in Morton order, see mortonOrder.
+    """
+
+    def __init__(self, filepath, model, weldDistance=None, profile=NULL_PROFILE, compressLevel=None, validate=False,
+                 spatialOrder=False):
+        super().__init__(daemon=True)
+        self.filepath = filepath
+        self.model = model
+        self.weldDistance = weldDistance
+        self.profile = profile
+        self.compressLevel = compressLevel
+        self.validate = validate
+        self.spatialOrder = spatialOrder
+        self.validation = None
+        self.progress = 0.0
+        self.message = None
+        self.error = None
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def step(self, progress):
+        if self.cancelled.is_set():
+            raise ExportCancelled()
+        self.progress = progress
+
+    def steps(self, start, end):  # progress callback for a phase, cancel() is noticed inside it too
+        return lambda fraction: self.step(start + (end - start)*fraction)
+
+    def run(self):
+        try:
+            self.export()
+        except ExportCancelled:
+            pass
+        except Exception as error:
+            self.error = error
+
+    def export(self):
+        model = self.model
+        profile = self.profile
+        if self.weldDistance is not None:
+            with profile.phase("weld", vertices=model.vertexCount) as phase:
+                model = weldVertices(model, self.weldDistance, self.steps(0.05, 0.2))
+                phase.count(weldedVertices=model.vertexCount)
+
+        if self.validate:
+            with profile.phase("validate", triangles=model.triangleCount) as phase:
+                self.validation = validateModel(model, progress=self.steps(0.2, 0.35))
+                phase.count(problems=len(self.validation.triangles()))
+
+        self.step(0.35)
+        if model.vertexCount <= MAX_VERTEX_COUNT:
+            if self.spatialOrder:
+                with profile.phase("morton order", triangles=model.triangleCount):
+                    model = mortonOrder(model, self.steps(0.35, 0.5))
+            files = [(self.filepath, encode(model, profile, self.steps(0.5, 0.7)))]
+            self.message = "Exported %d triangles" % model.triangleCount
+        else:  # too many vertices for uint16 indices, split the stage into several col files
+            with profile.phase("partition", vertices=model.vertexCount) as phase:
+                chunks = partitionModel(model, progress=self.steps(0.35, 0.45))
+                phase.count(chunks=len(chunks))
+            if self.spatialOrder:
+                with profile.phase("morton order", triangles=model.triangleCount):
+                    chunks = [mortonOrder(chunk, self.steps(0.45 + 0.05*i/len(chunks), 0.45 + 0.05*(i + 1)/len(chunks)))
+                              for i, chunk in enumerate(chunks)]
+            files = chunkFiles(self.filepath, chunks, profile, self.steps(0.5, 0.7))
+            self.message = "Split into %d col files, see %s" % (len(chunks), os.path.basename(files[-1][0]))
+
+        if self.compressLevel is not None:
+            files = self.compress(files, 0.7, 0.9)
+
+        self.step(0.9)
+        with profile.phase("write", files=len(files)) as phase:
+            stale = staleFiles(self.filepath, files)
+            for path, data in files:
+                writeFile(path, data)
+                phase.count(bytes=len(data))
+            for path in stale:
+                os.remove(path)
+        if stale:
+            self.message += ", removed %d files of an earlier export" % len(stale)
+        self.progress = 1.0
+
+    def compress(self, files, start, end, chunkSize=0x10000):  # Yaz0 compress the col files, progress going from start to end
+        colSize = sum(len(data) for path, data in files if not path.endswith(".json"))
+        done = 0
+        compressed = []
+        with self.profile.phase("compress", bytes=colSize) as phase:
+            for path, data in files:
+                if path.endswith(".json"):  # the manifest stays readable
+                    compressed.append((path, data))
+                    continue
+                stream = io.BytesIO()
+                # a chunk at a time so cancel() is noticed
+                compressTo(stream, data, self.compressLevel, chunkSize,
+                           lambda fileDone: self.step(start + (end - start)*(done + fileDone)/colSize))
+                done += len(data)
+                compressed.append((path, stream.getvalue()))
+                phase.count(compressedBytes=len(compressed[-1][1]))
+        return compressed
+
+
+class ExportCache(object):
+    """Extracted models of each object, stored on disk between exports.
+
+    Every entry is keyed on the object's name and a hash of everything its
+    extraction depends on, an object is only extracted again once its hash
+    changes. The file is a line of JSON describing the entries followed by
+    the raw bytes of their arrays, in the same order. Unreadable or outdated
+    cache files are ignored.
+    """
+
+    version = 2
+    arrayNames = ("vertices", "vertexIndices", "colTypes", "terrainTypes", "unknowns", "colParameters", "hasColParameters")
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.entries = {}  # object name -> (hash, model state)
+        self.used = set()
+
+    def load(self):
+        try:
+            with open(self.filepath, "rb") as cacheStream:
+                header = json.loads(cacheStream.readline())
+                if header["version"] != self.version or header["byteorder"] != sys.byteorder:
+                    return
+                entries = {}
+                for name, (key, layout) in header["entries"].items():
+                    state = {}
+                    for arrayName, (typecode, length) in zip(self.arrayNames, layout):
+                        values = array(typecode)
+                        size = values.itemsize*length
+                        data = cacheStream.read(size)
+                        if len(data) != size:
+                            return
+                        values.frombytes(data)
+                        state[arrayName] = values
+                    entries[name] = (key, state)
+        except Exception:
+            return
+        self.entries = entries
+
+    def save(self):  # only objects used since load() are kept
+        entries = {name: entry for name, entry in self.entries.items() if name in self.used}
+        header = {"version": self.version,
+                  "byteorder": sys.byteorder,
+                  "entries": {name: (key, [(state[arrayName].typecode, len(state[arrayName])) for arrayName in self.arrayNames])
+                              for name, (key, state) in entries.items()}}
+        temporaryPath = self.filepath + ".tmp"
+        with open(temporaryPath, "wb") as cacheStream:
+            cacheStream.write(json.dumps(header, separators=(",", ":")).encode() + b"\n")
+            for key, state in entries.values():
+                for arrayName in self.arrayNames:
+                    cacheStream.write(state[arrayName].tobytes())
+        os.replace(temporaryPath, self.filepath)
+
+    def get(self, name, key):
+        self.used.add(name)
+        entry = self.entries.get(name)
+        if entry is None or entry[0] != key:
+            return None
+        model = CollisionModel()
+        model.__dict__.update(entry[1])
+        return model
+
+    def put(self, name, key, model):
+        self.used.add(name)
+        self.entries[name] = (key, {arrayName: getattr(model, arrayName) for arrayName in self.arrayNames})
@@ -0,0 +1,182 @@
+from colcodec.model import *
+from math import floor
+
+
+def weldVertices(model, tolerance, progress=None):  # merge vertices closer than tolerance, dropping triangles that collapse
+    """Weld the vertices of a model using a spatial hash grid.
+
+    Each vertex is merged into the first vertex seen within tolerance of it.
+    The grid's cells are tolerance wide, so only the 27 cells around a vertex
+    have to be searched. A tolerance of 0 merges exactly coincident vertices.
+    Triangles left with a repeated vertex index are dropped.
+    """
+    welded = CollisionModel(model.vertexIndices.typecode)
+    weldedVertices = welded.vertices
+    remap = array("I")
+    grid = {}  # cell -> indices of welded vertices in it
+    toleranceSquared = tolerance*tolerance
+    neighbours = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)]
+
+    coordinates = iter(model.vertices)
+    for index, (x, y, z) in enumerate(zip(coordinates, coordinates, coordinates)):
+        if progress is not None and index % PROGRESS_INTERVAL == 0:
+            progress(index/model.vertexCount)
+        match = None
+        if tolerance > 0:
+            cell = (floor(x/tolerance), floor(y/tolerance), floor(z/tolerance))
+            for dx, dy, dz in neighbours:
+                for candidate in grid.get((cell[0] + dx, cell[1] + dy, cell[2] + dz), ()):
+                    ox = weldedVertices[3*candidate] - x
+                    oy = weldedVertices[3*candidate + 1] - y
+                    oz = weldedVertices[3*candidate + 2] - z
+                    if ox*ox + oy*oy + oz*oz <= toleranceSquared:
+                        match = candidate
+                        break
+                if match is not None:
+                    break
+        else:
+            cell = (x, y, z)
+            match = grid.get(cell, (None,))[0]
+        if match is None:
+            match = welded.addVertex(x, y, z)
+            grid.setdefault(cell, []).append(match)
+        remap.append(match)
+
+    welded.vertexIndices = array(model.vertexIndices.typecode, map(remap.__getitem__, model.vertexIndices))
+    welded.colTypes = model.colTypes
+    welded.terrainTypes = model.terrainTypes
+    welded.unknowns = model.unknowns
+    welded.colParameters = model.colParameters
+    welded.hasColParameters = model.hasColParameters
+
+    indices = iter(welded.vertexIndices)
+    triangles = [index for index, (a, b, c) in enumerate(zip(indices, indices, indices))
+                 if a != b and b != c and a != c]
+    return welded.subset(triangles)
+
+
+def compactModel(model, triangles):  # only the given triangles and the vertices they use, reindexed
+    remap = {}
+    vertices = array("f")
+    vertexIndices = array(model.vertexIndices.typecode)
+    for index in gather(model.vertexIndices, triangles, 3):
+        newIndex = remap.get(index)
+        if newIndex is None:
+            newIndex = remap[index] = len(remap)
+            vertices.extend(model.vertices[3*index:3*index + 3])
+        vertexIndices.append(newIndex)
+
+    chunk = model.subset(triangles)
+    chunk.vertices = vertices
+    chunk.vertexIndices = vertexIndices
+    return chunk
+
+
+def modelBounds(model):  # ((min x, min y, min z), (max x, max y, max z))
+    if model.vertexCount == 0:
+        return (0.0, 0.0, 0.0), (0.0, 0.0, 0.0)
+    axes = [model.vertices[axis::3] for axis in range(3)]
+    return tuple(min(values) for values in axes), tuple(max(values) for values in axes)
+
+
+def partitionModel(model, maxVertexCount=MAX_VERTEX_COUNT, progress=None):
+    """Split a model into chunks that each use at most maxVertexCount vertices.
+
+    Triangles are split recursively at the median of their centroids along the
+    longest axis of the node's bounds (a k-d split). Every chunk gets its own
+    vertex list, so only vertices on the cut boundaries are duplicated.
+    """
+    indices = model.vertexIndices
+    vertices = model.vertices
+    centroids = [array("f") for axis in range(3)]
+    for a, b, c in zip(*[iter(indices)]*3):
+        for axis in range(3):
+            centroids[axis].append(vertices[3*a + axis] + vertices[3*b + axis] + vertices[3*c + axis])
+
+    chunks = []
+
+    def split(triangles):
+        chunk = compactModel(model, triangles)
+        if chunk.vertexCount <= maxVertexCount or len(triangles) < 2:
+            chunks.append(chunk)
+            if progress is not None:
+                progress(sum(chunk.triangleCount for chunk in chunks)/model.triangleCount)
+            return
+        minimum, maximum = modelBounds(chunk)
+        axis = max(range(3), key=lambda axis: maximum[axis] - minimum[axis])
+        key = centroids[axis].__getitem__
+        triangles = sorted(triangles, key=lambda index: (key(index), index))
+        middle = len(triangles)//2
+        split(triangles[:middle])
+        split(triangles[middle:])
+
+    split(list(range(model.triangleCount)))
+    return chunks
+
+
+MORTON_BITS = 21  # per axis, three axes fit a 63 bit code
+
+
+def spreadBits(value):  # put two zero bits between each of the low 21 bits
+    value &= 0x1FFFFF
+    value = (value | value << 32) & 0x1F00000000FFFF
+    value = (value | value << 16) & 0x1F0000FF0000FF
+    value = (value | value << 8) & 0x100F00F00F00F00F
+    value = (value | value << 4) & 0x10C30C30C30C30C3
+    value = (value | value << 2) & 0x1249249249249249
+    return value
+
+
+def mortonCode(x, y, z):  # interleave three quantized coordinates into a Z-order code
+    return spreadBits(x) | spreadBits(y) << 1 | spreadBits(z) << 2
+
+
+def mortonOrder(model, progress=None):
+    """Copy of a model laid out along a Z-order curve.
+
+    Vertices are sorted by the Morton code of their position quantized to
+    MORTON_BITS per axis over the model's bounds, and triangles by their group
+    (colType, hasColParameter) and then the code of their centroid, so
+    triangles close in space end up close in the file. Ties are broken by
+    the values themselves rather than the input order, which makes the
+    layout depend only on the geometry and its collision values.
+    """
+    minimum, maximum = modelBounds(model)
+    top = (1 << MORTON_BITS) - 1
+    scales = [top/(maximum[axis] - minimum[axis]) if maximum[axis] > minimum[axis] else 0.0 for axis in range(3)]
+    minX, minY, minZ = minimum
+    scaleX, scaleY, scaleZ = scales
+
+    cells = []  # quantized (x, y, z) of each vertex
+    vertexKeys = []
+    coordinates = iter(model.vertices)
+    for index, (x, y, z) in enumerate(zip(coordinates, coordinates, coordinates)):
+        if progress is not None and index % PROGRESS_INTERVAL == 0:
+            progress(0.5*index/model.vertexCount)
+        cell = (int((x - minX)*scaleX), int((y - minY)*scaleY), int((z - minZ)*scaleZ))
+        cells.append(cell)
+        vertexKeys.append((mortonCode(*cell), x, y, z))
+    order = sorted(range(model.vertexCount), key=vertexKeys.__getitem__)
+    remap = array("I", bytes(4*model.vertexCount))
+    for newIndex, oldIndex in enumerate(order):
+        remap[oldIndex] = newIndex
+
+    ordered = CollisionModel(model.vertexIndices.typecode)
+    ordered.vertices = gather(model.vertices, order, 3)
+    ordered.vertexIndices = array(model.vertexIndices.typecode, map(remap.__getitem__, model.vertexIndices))
+    ordered.colTypes = model.colTypes
+    ordered.terrainTypes = model.terrainTypes
+    ordered.unknowns = model.unknowns
+    ordered.colParameters = model.colParameters
+    ordered.hasColParameters = model.hasColParameters
+
+    triangleKeys = []
+    indices = iter(ordered.vertexIndices)
+    for index, (a, b, c) in enumerate(zip(indices, indices, indices)):
+        if progress is not None and index % PROGRESS_INTERVAL == 0:
+            progress(0.5 + 0.5*index/model.triangleCount)
+        (ax, ay, az), (bx, by, bz), (cx, cy, cz) = cells[order[a]], cells[order[b]], cells[order[c]]
+        triangleKeys.append((model.colTypes[index], model.hasColParameters[index],
+                             mortonCode((ax + bx + cx)//3, (ay + by + cy)//3, (az + bz + cz)//3),
+                             a, b, c, model.terrainTypes[index], model.unknowns[index], model.colParameters[index]))
+    return ordered.subset(sorted(range(model.triangleCount), key=triangleKeys.__getitem__))
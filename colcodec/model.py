@@ -0,0 +1,310 @@
+from btypes.big_endian import *
+from colcodec.profiling import *
+from array import array
+from operator import itemgetter
+import sys
+
+
+class Header(Struct):
+    vertexCount = uint32
+    vertexOffset = uint32
+    groupCount = uint32
+    groupOffset = uint32
+
+
+class vertex(Struct):
+    x = float32
+    y = float32
+    z = float32
+
+    def __init__(self, x, y, z):
+        self.x = x
+        self.y = y
+        self.z = z
+
+
+class Group(Struct):
+    collisionType = uint16  # Properties of collision. e.g. is it water? or what?
+    triangleCount = uint16
+
+    __padding__ = Padding(1, b"\x00")  # Group flags, set them to 0 here
+    # Set 0x0001 to 1 if we have colParameter values so the game doesn"t ignore it
+    hasColParameter = bool8
+    __padding__ = Padding(2)  # Actual padding
+    vertexindexOffset = uint32
+    terrainTypeOffset = uint32  # 0-18,20,21,23,24,27-31
+    unknownOffset = uint32  # 0-27
+    # 0,1,2,3,4,8,255,6000,7500,7800,8000,8400,9000,10000,10300,12000,14000,17000,19000,20000,21000,22000,27500,30300
+    colParameterOffset = uint32
+
+
+MAX_VERTEX_COUNT = 0x10000  # vertex indices are uint16
+PROGRESS_INTERVAL = 0x1000  # items between the progress callbacks of long loops, which may raise to stop them
+MAX_GROUP_TRIANGLES = 0xFFFF  # Group.triangleCount is a uint16, a collision type can have several groups
+
+
+class CollisionModel(object):
+    """Columnar collision model.
+
+    Vertices are stored as a flat float32 array of x, y, z triples and
+    triangles as a flat uint16 array of vertex index triples, with one entry
+    per triangle in each of the attribute arrays. A triangle without a
+    colParameter has hasColParameters set to 0 and colParameters set to 0.
+
+    Models that are still being assembled for export may use a wider index
+    typecode, encode() narrows the indices to uint16 when the file is written.
+    """
+
+    def __init__(self, indexTypecode="H"):
+        self.vertices = array("f")
+        self.vertexIndices = array(indexTypecode)
+        self.colTypes = array("H")
+        self.terrainTypes = array("B")
+        self.unknowns = array("B")
+        self.colParameters = array("H")
+        self.hasColParameters = array("B")
+
+    @property
+    def vertexCount(self):
+        return len(self.vertices)//3
+
+    @property
+    def triangleCount(self):
+        return len(self.colTypes)
+
+    def addVertex(self, x, y, z):
+        self.vertices.extend((x, y, z))
+        return self.vertexCount - 1
+
+    def addTriangle(self, vertexIndices, colType=0, terrainType=0, unknown=0, colParameter=None):
+        self.vertexIndices.extend(vertexIndices)
+        self.colTypes.append(colType)
+        self.terrainTypes.append(terrainType)
+        self.unknowns.append(unknown)
+        self.colParameters.append(colParameter or 0)
+        self.hasColParameters.append(colParameter is not None)
+
+    def extend(self, other):  # append another model, shifting its vertex indices past our vertices
+        indexOffset = self.vertexCount
+        if indexOffset == 0 and other.vertexIndices.typecode == self.vertexIndices.typecode:
+            self.vertexIndices.extend(other.vertexIndices)
+        else:
+            self.vertexIndices.extend(array(self.vertexIndices.typecode, map(indexOffset.__add__, other.vertexIndices)))
+        self.vertices.extend(other.vertices)
+        self.colTypes.extend(other.colTypes)
+        self.terrainTypes.extend(other.terrainTypes)
+        self.unknowns.extend(other.unknowns)
+        self.colParameters.extend(other.colParameters)
+        self.hasColParameters.extend(other.hasColParameters)
+
+    def subset(self, triangles):  # model with the same vertices and only the given triangles
+        model = CollisionModel(self.vertexIndices.typecode)
+        model.vertices = self.vertices
+        model.vertexIndices = gather(self.vertexIndices, triangles, 3)
+        model.colTypes = gather(self.colTypes, triangles)
+        model.terrainTypes = gather(self.terrainTypes, triangles)
+        model.unknowns = gather(self.unknowns, triangles)
+        model.colParameters = gather(self.colParameters, triangles)
+        model.hasColParameters = gather(self.hasColParameters, triangles)
+        return model
+
+    def attributes(self, index):  # (colType, terrainType, unknown, colParameter) of a triangle
+        colParameter = self.colParameters[index] if self.hasColParameters[index] else None
+        return self.colTypes[index], self.terrainTypes[index], self.unknowns[index], colParameter
+
+
+def toBigEndian(values):  # array -> big endian bytes
+    if sys.byteorder == "little" and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def decodeBigEndian(typecode, data):  # big endian bytes -> array
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "little" and values.itemsize > 1:
+        values.byteswap()
+    return values
+
+
+def readBigEndian(stream, typecode, count):  # read count big endian values into an array
+    size = count*array(typecode).itemsize
+    data = stream.read(size)
+    if len(data) != size:
+        raise FormatError("unexpected end of file")
+    return decodeBigEndian(typecode, data)
+
+
+def gather(values, indices, stride=1):  # values of the given elements, stride values per element
+    if stride != 1:
+        indices = [index*stride + i for index in indices for i in range(stride)]
+    if len(indices) == 0:
+        return array(values.typecode)
+    if len(indices) == 1:
+        return array(values.typecode, (values[indices[0]],))
+    return array(values.typecode, itemgetter(*indices)(values))
+
+
+class TriangleGroup(object):
+    """Triangles of a CollisionModel that share a group identity.
+
+    The sizes of the group's sections follow from its triangle count, so the
+    file layout is known as soon as grouping is done.
+    """
+
+    def __init__(self, colType, hasColParameter):
+        self.colType = colType
+        self.hasColParameter = hasColParameter
+        self.triangles = []  # triangle indices into the model
+
+    @property
+    def key(self):
+        return self.colType, self.hasColParameter
+
+    @property
+    def triangleCount(self):
+        return len(self.triangles)
+
+    @property
+    def vertexIndexSize(self):
+        return 6*len(self.triangles)
+
+    @property
+    def terrainTypeSize(self):
+        return len(self.triangles)
+
+    @property
+    def unknownSize(self):
+        return len(self.triangles)
+
+    @property
+    def colParameterSize(self):
+        return 2*len(self.triangles) if self.hasColParameter else 0
+
+
+def groupTriangles(model):  # single pass, groups keep the order they are started in
+    groups = []
+    openGroups = {}  # key -> group still taking triangles
+    for index, key in enumerate(zip(model.colTypes, model.hasColParameters)):
+        group = openGroups.get(key)
+        if group is None or len(group.triangles) == MAX_GROUP_TRIANGLES:  # full groups are continued by another
+            group = openGroups[key] = TriangleGroup(key[0], bool(key[1]))
+            groups.append(group)
+        group.triangles.append(index)
+    return groups
+
+
+def layout(model, groups):  # -> Header, Group records and file size with every offset resolved
+    header = Header()
+    header.vertexCount = model.vertexCount
+    header.vertexOffset = Header.sizeof() + Group.sizeof()*len(groups)
+    header.groupCount = len(groups)
+    header.groupOffset = Header.sizeof()
+
+    records = []
+    for group in groups:
+        record = Group()
+        record.collisionType = group.colType
+        record.triangleCount = group.triangleCount
+        record.hasColParameter = group.hasColParameter
+        records.append(record)
+
+    offset = header.vertexOffset + 12*header.vertexCount
+    for group, record in zip(groups, records):
+        record.vertexindexOffset = offset
+        offset += group.vertexIndexSize
+    for group, record in zip(groups, records):
+        record.terrainTypeOffset = offset
+        offset += group.terrainTypeSize
+    for group, record in zip(groups, records):
+        record.unknownOffset = offset
+        offset += group.unknownSize
+    for group, record in zip(groups, records):
+        record.colParameterOffset = offset if group.hasColParameter else 0
+        offset += group.colParameterSize
+
+    return header, records, offset
+
+
+def encode(model, profile=NULL_PROFILE, progress=None):  # lay out the whole col file in a single preallocated buffer
+    if model.vertexCount > MAX_VERTEX_COUNT:
+        raise ValueError("%d vertices exceed the %d a col file can index" % (model.vertexCount, MAX_VERTEX_COUNT))
+
+    with profile.phase("group", triangles=model.triangleCount) as phase:
+        groups = groupTriangles(model)
+        phase.count(groups=len(groups))
+
+    with profile.phase("layout"):
+        header, records, size = layout(model, groups)
+        buffer = bytearray(size)
+        Header.pack_into(buffer, 0, header)
+        for i, record in enumerate(records):
+            Group.pack_into(buffer, header.groupOffset + i*Group.sizeof(), record)
+
+    def write(offset, data):
+        buffer[offset:offset + len(data)] = data
+
+    with profile.phase("encode sections", vertices=model.vertexCount, bytes=size):
+        write(header.vertexOffset, toBigEndian(model.vertices))
+
+        for i, (group, record) in enumerate(zip(groups, records)):
+            if progress is not None:
+                progress(i/len(groups))
+            write(record.vertexindexOffset, toBigEndian(array("H", gather(model.vertexIndices, group.triangles, 3))))
+            write(record.terrainTypeOffset, gather(model.terrainTypes, group.triangles).tobytes())
+            write(record.unknownOffset, gather(model.unknowns, group.triangles).tobytes())
+            if group.hasColParameter:
+                write(record.colParameterOffset, toBigEndian(gather(model.colParameters, group.triangles)))
+
+    return buffer
+
+
+def pack(stream, model, profile=NULL_PROFILE):  # pack collision model into col file, the stream doesn't need to be seekable
+    data = encode(model, profile)
+    with profile.phase("write", bytes=len(data)):
+        stream.write(data)
+
+
+def unpack(stream, profile=NULL_PROFILE):
+    with profile.phase("read header") as phase:
+        header = Header.unpack(stream)
+
+        stream.seek(header.groupOffset)
+        groupTable = stream.read(Group.sizeof()*header.groupCount)
+        if len(groupTable) != Group.sizeof()*header.groupCount:
+            raise FormatError("unexpected end of file")
+        groups = [Group.unpack_from(groupTable, i*Group.sizeof()) for i in range(header.groupCount)]
+        phase.count(groups=header.groupCount)
+
+    model = CollisionModel()
+    with profile.phase("read vertices", vertices=header.vertexCount):
+        stream.seek(header.vertexOffset)
+        model.vertices = readBigEndian(stream, "f", 3*header.vertexCount)
+
+    with profile.phase("read triangles") as phase:
+        readGroups(stream, groups, model)
+        phase.count(triangles=model.triangleCount)
+
+    return model
+
+
+def readGroups(stream, groups, model):  # append the triangles of every group to model
+    for group in groups:
+        model.colTypes.extend(array("H", (group.collisionType,))*group.triangleCount)
+        model.hasColParameters.extend(array("B", (group.hasColParameter,))*group.triangleCount)
+
+        stream.seek(group.vertexindexOffset)
+        model.vertexIndices.extend(readBigEndian(stream, "H", 3*group.triangleCount))
+
+        stream.seek(group.terrainTypeOffset)
+        model.terrainTypes.extend(readBigEndian(stream, "B", group.triangleCount))
+
+        stream.seek(group.unknownOffset)
+        model.unknowns.extend(readBigEndian(stream, "B", group.triangleCount))
+
+        if not group.hasColParameter:
+            model.colParameters.extend(array("H", (0,))*group.triangleCount)
+            continue
+        stream.seek(group.colParameterOffset)
+        model.colParameters.extend(readBigEndian(stream, "H", group.triangleCount))
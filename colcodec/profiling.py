@@ -0,0 +1,102 @@
+from contextlib import contextmanager
+import json
+import time
+import tracemalloc
+
+
+class Phase(object):
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.peakBytes = None
+        self.counts = {}
+
+    def count(self, **counts):  # add to the item counts of the phase
+        for name, value in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def toDict(self):
+        return {"phase": self.name,
+                "calls": self.calls,
+                "seconds": self.seconds,
+                "peakBytes": self.peakBytes,
+                "counts": dict(self.counts)}
+
+
+class Profile(object):
+    """Wall time, item counts and peak memory of each phase of an import or export.
+
+    Phases with the same name add up, so a phase can be entered once per
+    object. Peak memory is only traced with traceMemory, which makes the
+    profiled code noticeably slower. Without tracemalloc.reset_peak (Python
+    3.8 and older) the peak of a phase is the peak since tracing started.
+    """
+
+    def __init__(self, name, traceMemory=False):
+        self.name = name
+        self.traceMemory = traceMemory
+        self.phases = {}  # name -> Phase, in the order they first ran
+
+    @contextmanager
+    def phase(self, name, **counts):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase(name)
+        phase.count(**counts)
+
+        startedTracing = False
+        if self.traceMemory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                startedTracing = True
+            elif hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+
+        start = time.perf_counter()
+        try:
+            yield phase
+        finally:
+            phase.seconds += time.perf_counter() - start
+            phase.calls += 1
+            if self.traceMemory:
+                peak = tracemalloc.get_traced_memory()[1]
+                phase.peakBytes = peak if phase.peakBytes is None else max(phase.peakBytes, peak)
+                if startedTracing:
+                    tracemalloc.stop()
+
+    @property
+    def seconds(self):
+        return sum(phase.seconds for phase in self.phases.values())
+
+    def summary(self):  # one line, fit for an operator report
+        parts = []
+        for phase in self.phases.values():
+            part = "%s %.1f ms" % (phase.name, phase.seconds*1000)
+            details = ["%d %s" % (value, name) for name, value in phase.counts.items()]
+            if phase.peakBytes is not None:
+                details.append("%.1f MiB peak" % (phase.peakBytes/(1024*1024)))
+            if details:
+                part += " (" + ", ".join(details) + ")"
+            parts.append(part)
+        return "%s %.1f ms: %s" % (self.name, self.seconds*1000, "; ".join(parts))
+
+    def toDict(self):
+        return {"name": self.name,
+                "seconds": self.seconds,
+                "phases": [phase.toDict() for phase in self.phases.values()]}
+
+    def dump(self, filepath):
+        with open(filepath, "w") as stream:
+            json.dump(self.toDict(), stream, indent=4)
+
+
+class NullProfile(object):  # stands in when nothing is being profiled
+
+    @contextmanager
+    def phase(self, name, **counts):
+        yield Phase(name)
+
+
+NULL_PROFILE = NullProfile()
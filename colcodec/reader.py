@@ -0,0 +1,160 @@
+from colcodec.model import *
+from colcodec.yaz0 import *
+import mmap
+
+
+class MappedGroup(object):
+    """Lazy view of one group of a memory-mapped COL file.
+
+    The section properties are memoryview slices over the mapping, the
+    decode methods turn them into arrays on demand.
+    """
+
+    def __init__(self, reader, group):
+        self.reader = reader
+        self.group = group
+
+    @property
+    def collisionType(self):
+        return self.group.collisionType
+
+    @property
+    def triangleCount(self):
+        return self.group.triangleCount
+
+    @property
+    def hasColParameter(self):
+        return bool(self.group.hasColParameter)
+
+    @property
+    def vertexIndexData(self):
+        return self.reader.section(self.group.vertexindexOffset, 6*self.group.triangleCount)
+
+    @property
+    def terrainTypeData(self):
+        return self.reader.section(self.group.terrainTypeOffset, self.group.triangleCount)
+
+    @property
+    def unknownData(self):
+        return self.reader.section(self.group.unknownOffset, self.group.triangleCount)
+
+    @property
+    def colParameterData(self):
+        if not self.group.hasColParameter:
+            return None
+        return self.reader.section(self.group.colParameterOffset, 2*self.group.triangleCount)
+
+    def decodeVertexIndices(self):
+        return decodeBigEndian("H", self.vertexIndexData)
+
+    def decodeTerrainTypes(self):
+        return decodeBigEndian("B", self.terrainTypeData)
+
+    def decodeUnknowns(self):
+        return decodeBigEndian("B", self.unknownData)
+
+    def decodeColParameters(self):  # None if the group has no colParameter section
+        data = self.colParameterData
+        if data is None:
+            return None
+        return decodeBigEndian("H", data)
+
+    def decodeTriangles(self, model, start=0, end=None):  # append triangles start to end of the group to model
+        end = self.triangleCount if end is None else end
+        count = end - start
+        model.colTypes.extend(array("H", (self.collisionType,))*count)
+        model.hasColParameters.extend(array("B", (self.hasColParameter,))*count)
+        model.vertexIndices.extend(decodeBigEndian("H", self.vertexIndexData[6*start:6*end]))
+        model.terrainTypes.extend(decodeBigEndian("B", self.terrainTypeData[start:end]))
+        model.unknowns.extend(decodeBigEndian("B", self.unknownData[start:end]))
+        data = self.colParameterData
+        if data is None:
+            model.colParameters.extend(array("H", (0,))*count)
+        else:
+            model.colParameters.extend(decodeBigEndian("H", data[2*start:2*end]))
+
+
+class COLReader(object):
+    """Zero-copy reader for COL files.
+
+    Only the Header and the Group table are parsed when the file is opened,
+    vertex and triangle sections are exposed as memoryview slices and decoded
+    when accessed. Views handed out by the reader should be released before
+    close(), otherwise the mapping stays alive until they are collected.
+    Yaz0 compressed files are decompressed into memory instead of mapped.
+    """
+
+    def __init__(self, filepath):
+        self.file = open(filepath, "rb")
+        self.map = None
+        if self.file.read(4) == YAZ0_MAGIC:
+            try:
+                self.file.seek(0)
+                self.buffer = memoryview(decompress(self.file.read()))
+            except:
+                self.file.close()
+                raise
+        else:
+            try:
+                self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty files can't be mapped
+                self.file.close()
+                raise FormatError("empty COL file")
+            self.buffer = memoryview(self.map)
+
+        try:
+            self.header = Header.unpack_from(self.section(0, Header.sizeof()))
+            groupTable = self.section(self.header.groupOffset, Group.sizeof()*self.header.groupCount)
+            self.groups = [MappedGroup(self, Group.unpack_from(groupTable, i*Group.sizeof()))
+                           for i in range(self.header.groupCount)]
+            groupTable.release()
+        except:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.groups = []
+        self.buffer.release()
+        try:
+            if self.map is not None:
+                self.map.close()
+        except BufferError:  # outstanding views, the mapping is freed with them
+            pass
+        self.file.close()
+
+    def section(self, offset, size):
+        if offset + size > len(self.buffer):
+            raise FormatError("section at 0x%X runs past the end of the file" % offset)
+        return self.buffer[offset:offset + size]
+
+    @property
+    def vertexData(self):
+        return self.section(self.header.vertexOffset, 12*self.header.vertexCount)
+
+    def decodeVertices(self):
+        return decodeBigEndian("f", self.vertexData)
+
+    def groupsOfType(self, colType):
+        return [group for group in self.groups if group.collisionType == colType]
+
+    def decode(self, colTypes=None):  # decode the whole file, or only groups of the given types, into a CollisionModel
+        model = CollisionModel()
+        model.vertices = self.decodeVertices()
+        for group in self.groups:
+            if colTypes is None or group.collisionType in colTypes:
+                group.decodeTriangles(model)
+        return model
+
+
+def readCOL(filepath, colTypes=None, profile=NULL_PROFILE):  # -> CollisionModel, module level so process pools can pickle it
+    if colTypes is None:
+        with openCOL(filepath) as stream:  # Yaz0 compressed files are decompressed in memory
+            return unpack(stream, profile)
+    with profile.phase("read groups"), COLReader(filepath) as reader:
+        return reader.decode(colTypes)
@@ -0,0 +1,244 @@
+from colcodec.model import *
+from math import floor, isfinite, sqrt
+
+
+OUT_OF_RANGE = "out of range"  # a vertex index past the vertices
+DEGENERATE = "degenerate"  # the same vertex index twice
+NON_FINITE = "non-finite"  # a vertex with a NaN or infinite coordinate
+DUPLICATE = "duplicate"  # the same vertices as an earlier triangle
+SLIVER = "sliver"  # (close to) zero area
+OVERLAP = "overlap"  # coplanar with a triangle it overlaps
+PROBLEMS = (OUT_OF_RANGE, DEGENERATE, NON_FINITE, DUPLICATE, SLIVER, OVERLAP)
+
+
+class Diagnostic(object):
+
+    def __init__(self, triangle, problem, other=None):
+        self.triangle = triangle
+        self.problem = problem
+        self.other = other  # the triangle this one duplicates or overlaps
+
+    def __str__(self):
+        if self.other is None:
+            return "triangle %d: %s" % (self.triangle, self.problem)
+        return "triangle %d: %s, with triangle %d" % (self.triangle, self.problem, self.other)
+
+
+class Validation(object):
+    """Every problem found in a model, a triangle can have several."""
+
+    def __init__(self, triangleCount):
+        self.triangleCount = triangleCount
+        self.diagnostics = []
+
+    def add(self, triangle, problem, other=None):
+        self.diagnostics.append(Diagnostic(triangle, problem, other))
+
+    @property
+    def ok(self):
+        return not self.diagnostics
+
+    def triangles(self, problems=PROBLEMS):  # -> sorted indices of the triangles with any of the problems
+        return sorted(set(diagnostic.triangle for diagnostic in self.diagnostics if diagnostic.problem in problems))
+
+    def counts(self):  # -> {problem: triangles with it}
+        triangles = {}
+        for diagnostic in self.diagnostics:
+            triangles.setdefault(diagnostic.problem, set()).add(diagnostic.triangle)
+        return {problem: len(triangles[problem]) for problem in PROBLEMS if problem in triangles}
+
+    def summary(self):
+        if self.ok:
+            return "no problems in %d triangles" % self.triangleCount
+        return ", ".join("%d %s" % (count, problem) for problem, count in self.counts().items())
+
+
+def validateModel(model, tolerance=0.001, sliverRatio=0.001, progress=None):
+    """Find broken triangles in a model, see PROBLEMS.
+
+    A triangle is a sliver when its height is at most sliverRatio times its
+    longest edge. Overlaps are found between triangles whose planes are less
+    than tolerance apart and that overlap by more than tolerance within that
+    plane, so neighbours that only share an edge don't count. Candidate pairs
+    come from a uniform grid with cells the size of a typical triangle,
+    which keeps the search close to linear in the number of triangles.
+    """
+    validation = Validation(model.triangleCount)
+    vertices = model.vertices
+    vertexCount = model.vertexCount
+    nonFinite = set(index//3 for index, value in enumerate(vertices) if not isfinite(value))
+
+    seen = {}  # sorted vertex indices -> first triangle using them
+    planar = []  # (triangle, unit normal, plane offset, points, bounds minimum, bounds maximum)
+    indices = iter(model.vertexIndices)
+    for triangle, corners in enumerate(zip(indices, indices, indices)):
+        if progress is not None and triangle % PROGRESS_INTERVAL == 0:
+            progress(0.5*triangle/model.triangleCount)
+        a, b, c = corners
+        if max(corners) >= vertexCount:
+            validation.add(triangle, OUT_OF_RANGE)
+            continue
+        if a == b or b == c or a == c:
+            validation.add(triangle, DEGENERATE)
+            continue
+        if a in nonFinite or b in nonFinite or c in nonFinite:
+            validation.add(triangle, NON_FINITE)
+            continue
+        key = tuple(sorted(corners))
+        first = seen.get(key)
+        if first is not None:
+            validation.add(triangle, DUPLICATE, first)
+            continue
+        seen[key] = triangle
+
+        p = vertices[3*a:3*a + 3]
+        q = vertices[3*b:3*b + 3]
+        r = vertices[3*c:3*c + 3]
+        u = (q[0] - p[0], q[1] - p[1], q[2] - p[2])
+        v = (r[0] - p[0], r[1] - p[1], r[2] - p[2])
+        w = (r[0] - q[0], r[1] - q[1], r[2] - q[2])
+        normal = (u[1]*v[2] - u[2]*v[1], u[2]*v[0] - u[0]*v[2], u[0]*v[1] - u[1]*v[0])
+        doubleArea = sqrt(normal[0]*normal[0] + normal[1]*normal[1] + normal[2]*normal[2])
+        longest = max(u[0]*u[0] + u[1]*u[1] + u[2]*u[2],
+                      v[0]*v[0] + v[1]*v[1] + v[2]*v[2],
+                      w[0]*w[0] + w[1]*w[1] + w[2]*w[2])
+        if doubleArea <= sliverRatio*longest:  # height/longest edge = double area/longest edge squared
+            validation.add(triangle, SLIVER)
+            continue
+        normal = (normal[0]/doubleArea, normal[1]/doubleArea, normal[2]/doubleArea)
+        planar.append((triangle, normal, normal[0]*p[0] + normal[1]*p[1] + normal[2]*p[2], (p, q, r),
+                       (min(p[0], q[0], r[0]), min(p[1], q[1], r[1]), min(p[2], q[2], r[2])),
+                       (max(p[0], q[0], r[0]), max(p[1], q[1], r[1]), max(p[2], q[2], r[2]))))
+
+    overlapProgress = None if progress is None else lambda fraction: progress(0.5 + 0.5*fraction)
+    for first, second in overlappingPairs(planar, tolerance, overlapProgress):
+        validation.add(first, OVERLAP, second)
+        validation.add(second, OVERLAP, first)
+    validation.diagnostics.sort(key=lambda diagnostic: diagnostic.triangle)
+    return validation
+
+
+MAX_CELLS = 64  # grid cells a triangle may cover before it moves up a level
+LEVEL_SCALE = 4  # cell size ratio between one grid level and the next
+
+
+def gridRange(minimum, maximum, cellSize, tolerance):  # -> (low cell, high cell) covered by the bounds
+    low = [floor((minimum[axis] - tolerance)/cellSize) for axis in range(3)]
+    high = [floor((maximum[axis] + tolerance)/cellSize) for axis in range(3)]
+    return low, high
+
+
+def gridKeys(axes, low, high):
+    for axis in axes:
+        for x in range(low[0], high[0] + 1):
+            for y in range(low[1], high[1] + 1):
+                for z in range(low[2], high[2] + 1):
+                    yield axis, x, y, z
+
+
+def overlappingPairs(planar, tolerance, progress=None):  # -> [(triangle, triangle)] of coplanar triangles that overlap
+    """Candidate pairs come from a hierarchy of grids.
+
+    Level 0 cells are about the size of a median triangle and each level up
+    is LEVEL_SCALE times coarser. A triangle goes into the finest level where
+    it covers at most MAX_CELLS cells, so a huge floor costs as little as a
+    small triangle, and is paired with the triangles sharing its cells there
+    and on every coarser level.
+    """
+    if len(planar) < 2:
+        return []
+    extents = sorted(max(maximum[axis] - minimum[axis] for axis in range(3))
+                     for triangle, normal, offset, points, minimum, maximum in planar)
+    cellSize = max(extents[len(extents)//2]*1.37, tolerance, 1e-6)  # off the grid real stages tend to be built on
+
+    grids = []  # level -> {(dominant normal axis, cell): indices into planar}
+    placed = []  # (level, dominant normal axes) of each triangle
+    for index, (triangle, normal, offset, points, minimum, maximum) in enumerate(planar):
+        magnitudes = sorted(((abs(normal[axis]), axis) for axis in range(3)), reverse=True)
+        axes = [magnitudes[0][1]]
+        if magnitudes[0][0] - magnitudes[1][0] < 0.01:  # parallel triangles may pick the other axis
+            axes.append(magnitudes[1][1])
+        level = 0
+        low, high = gridRange(minimum, maximum, cellSize, tolerance)
+        while (high[0] - low[0] + 1)*(high[1] - low[1] + 1)*(high[2] - low[2] + 1) > MAX_CELLS:
+            level += 1
+            low, high = gridRange(minimum, maximum, cellSize*LEVEL_SCALE**level, tolerance)
+        while len(grids) <= level:
+            grids.append({})
+        grid = grids[level]
+        for key in gridKeys(axes, low, high):
+            grid.setdefault(key, []).append(index)
+        placed.append((level, axes))
+
+    parallel = 1 - 1e-6
+    tested = set()
+    pairs = []
+
+    def test(first, second):
+        triangle, (nx, ny, nz), offset, points, (minX, minY, minZ), (maxX, maxY, maxZ) = planar[first]
+        other = planar[second]
+        otherNormal = other[1]
+        if abs(nx*otherNormal[0] + ny*otherNormal[1] + nz*otherNormal[2]) < parallel:
+            return
+        otherMinimum, otherMaximum = other[4], other[5]
+        if otherMinimum[0] > maxX + tolerance or minX > otherMaximum[0] + tolerance or \
+                otherMinimum[1] > maxY + tolerance or minY > otherMaximum[1] + tolerance or \
+                otherMinimum[2] > maxZ + tolerance or minZ > otherMaximum[2] + tolerance:
+            return
+        pair = (first, second) if first < second else (second, first)
+        if pair in tested:  # pairs that share several cells
+            return
+        tested.add(pair)
+        if any(abs(nx*x + ny*y + nz*z - offset) > tolerance for x, y, z in other[3]):
+            return
+        if overlapInPlane(points, other[3], (nx, ny, nz), tolerance):
+            pairs.append((min(triangle, other[0]), max(triangle, other[0])))
+
+    cellCount = sum(len(grid) for grid in grids)
+    cellsDone = 0
+    for grid in grids:
+        for members in grid.values():
+            if progress is not None and cellsDone % PROGRESS_INTERVAL == 0:
+                progress(0.8*cellsDone/cellCount)
+            cellsDone += 1
+            for i in range(len(members)):
+                nx, ny, nz = planar[members[i]][1]
+                for j in range(i + 1, len(members)):
+                    otherNormal = planar[members[j]][1]
+                    if abs(nx*otherNormal[0] + ny*otherNormal[1] + nz*otherNormal[2]) >= parallel:  # most pairs stop here, skip the call
+                        test(members[i], members[j])
+
+    for index, (level, axes) in enumerate(placed):  # against the bigger triangles of the levels above
+        if progress is not None and index % PROGRESS_INTERVAL == 0:
+            progress(0.8 + 0.2*index/len(placed))
+        minimum, maximum = planar[index][4], planar[index][5]
+        for coarser in range(level + 1, len(grids)):
+            grid = grids[coarser]
+            if not grid:
+                continue
+            low, high = gridRange(minimum, maximum, cellSize*LEVEL_SCALE**coarser, tolerance)
+            for key in gridKeys(axes, low, high):
+                for other in grid.get(key, ()):
+                    test(index, other)
+    return pairs
+
+
+def overlapInPlane(points, otherPoints, normal, tolerance):  # separating axis test in the plane of normal
+    dropped = max(range(3), key=lambda axis: abs(normal[axis]))
+    kept = [axis for axis in range(3) if axis != dropped]
+    first = [(point[kept[0]], point[kept[1]]) for point in points]
+    second = [(point[kept[0]], point[kept[1]]) for point in otherPoints]
+    for triangle in (first, second):
+        for i in range(3):
+            (ax, ay), (bx, by) = triangle[i], triangle[(i + 1) % 3]
+            axis = (ay - by, bx - ax)
+            length = sqrt(axis[0]*axis[0] + axis[1]*axis[1])
+            if length == 0:
+                continue
+            projected = [x*axis[0] + y*axis[1] for x, y in first]
+            otherProjected = [x*axis[0] + y*axis[1] for x, y in second]
+            overlap = min(max(projected), max(otherProjected)) - max(min(projected), min(otherProjected))
+            if overlap <= tolerance*length:  # apart, or only touching
+                return False
+    return True
+
@@ -0,0 +1,265 @@
+from colcodec.model import *
+import io
+import struct
+
+
+YAZ0_MAGIC = b"Yaz0"
+WINDOW = 0x1000  # farthest a match can reach back
+MIN_MATCH = 3
+MAX_MATCH = 0x111
+
+# level -> (candidates searched per position, length that ends the search, lazy matching)
+LEVELS = {0: (0, 0, False),
+          1: (2, 16, False),
+          2: (4, 32, False),
+          3: (8, 64, False),
+          4: (16, 64, True),
+          5: (32, 128, True),
+          6: (64, MAX_MATCH, True),
+          7: (128, MAX_MATCH, True),
+          8: (512, MAX_MATCH, True),
+          9: (WINDOW, MAX_MATCH, True)}
+DEFAULT_LEVEL = 6
+
+
+def isYaz0(data):
+    return bytes(data[:4]) == YAZ0_MAGIC
+
+
+class Yaz0Compressor(object):
+    """Incremental Yaz0 compressor, used like zlib.compressobj.
+
+    The header stores the decompressed size, so it has to be known up front.
+    Matches are found with hash chains over the last WINDOW bytes, keyed on
+    their first three bytes; the level picks how many candidates are tried
+    and whether a match can be deferred by a byte for a longer one.
+    """
+
+    def __init__(self, size, level=DEFAULT_LEVEL):
+        if level not in LEVELS:
+            raise ValueError("Yaz0 level must be between %d and %d" % (min(LEVELS), max(LEVELS)))
+        self.size = size
+        self.maxChain, self.niceLength, self.lazy = LEVELS[level]
+        self.data = b""  # the window before self.position and the input not encoded yet
+        self.base = 0  # position of data[0] in the input
+        self.position = 0  # next input position to encode
+        self.received = 0
+        self.head = {}  # three bytes -> last position starting with them
+        self.previous = array("i", (-1,))*WINDOW  # position % WINDOW -> earlier position with the same three bytes
+        self.output = bytearray(YAZ0_MAGIC + struct.pack(">I8x", size))
+        self.group = bytearray(b"\0")  # code byte followed by up to 8 tokens
+        self.tokenCount = 0
+
+    def compress(self, data):  # -> compressed bytes that are ready
+        self.received += len(data)
+        if self.received > self.size:
+            raise ValueError("more input than the %d bytes given as size" % self.size)
+        self.data = self.data[self.position - WINDOW - self.base:] if self.position - WINDOW > self.base else self.data
+        self.base = max(self.base, self.position - WINDOW)
+        self.data += bytes(data)
+        self.encode(self.base + len(self.data) - MAX_MATCH)
+        return self.takeOutput()
+
+    def flush(self):  # -> the rest of the compressed data
+        if self.received != self.size:
+            raise ValueError("expected %d bytes of input, got %d" % (self.size, self.received))
+        self.encode(self.base + len(self.data))
+        if self.tokenCount > 0:  # unused code bits stay 0
+            self.output += self.group
+            self.group = bytearray(b"\0")
+            self.tokenCount = 0
+        return self.takeOutput()
+
+    def takeOutput(self):
+        output = bytes(self.output)
+        self.output = bytearray()
+        return output
+
+    def insert(self, position):  # add a position to the hash chains
+        offset = position - self.base
+        key = self.data[offset:offset + 3]
+        self.previous[position % WINDOW] = self.head.get(key, -1)
+        self.head[key] = position
+
+    def findMatch(self, position, end):  # -> (length, distance) of the longest match found, length 0 if none
+        data = self.data
+        base = self.base
+        offset = position - base
+        limit = min(MAX_MATCH, end - position)
+        if limit < MIN_MATCH or self.maxChain == 0:
+            return 0, 0
+        candidate = self.head.get(data[offset:offset + 3], -1)
+        oldest = max(0, position - WINDOW)
+        bestLength = MIN_MATCH - 1
+        bestDistance = 0
+        chain = self.maxChain
+        while candidate >= oldest and chain > 0:
+            start = candidate - base
+            if data[start + bestLength] == data[offset + bestLength] and \
+                    data[start:start + bestLength] == data[offset:offset + bestLength]:
+                length = bestLength + 1
+                while length + 16 <= limit and data[start + length:start + length + 16] == data[offset + length:offset + length + 16]:
+                    length += 16
+                while length < limit and data[start + length] == data[offset + length]:
+                    length += 1
+                bestLength = length
+                bestDistance = position - candidate
+                if length >= self.niceLength or length == limit:
+                    break
+            candidate = self.previous[candidate % WINDOW]
+            chain -= 1
+        if bestDistance == 0:
+            return 0, 0
+        return bestLength, bestDistance
+
+    def encode(self, end):  # encode the input up to end, or as far as the input goes
+        end = min(end, self.base + len(self.data))
+        if self.maxChain == 0:
+            self.encodeLiterals(end)
+            return
+        total = self.base + len(self.data)
+        position = self.position
+        pending = None  # match found at position, kept from the lazy look ahead
+        while position < end:
+            length, distance = pending if pending is not None else self.findMatch(position, total)
+            pending = None
+            if position + 3 <= total:
+                self.insert(position)
+            if length >= MIN_MATCH and self.lazy and length < self.niceLength and position + 1 < end:
+                nextMatch = self.findMatch(position + 1, total)
+                if nextMatch[0] > length:  # a literal now buys a longer match
+                    self.literal(position)
+                    position += 1
+                    pending = nextMatch
+                    continue
+            if length < MIN_MATCH:
+                self.literal(position)
+                position += 1
+                continue
+            self.reference(length, distance)
+            for skipped in range(position + 1, min(position + length, total - 2)):
+                self.insert(skipped)
+            position += length
+        self.position = position
+
+    def encodeLiterals(self, end):  # level 0, no matches to look for so no hash chains to keep either
+        position = self.position
+        while self.tokenCount > 0 and position < end:  # finish the open group
+            self.literal(position)
+            position += 1
+        data = self.data
+        fullEnd = position + max(0, end - position)//8*8
+        self.output += b"".join(b"\xFF" + data[offset:offset + 8]
+                                for offset in range(position - self.base, fullEnd - self.base, 8))
+        position = fullEnd
+        while position < end:
+            self.literal(position)
+            position += 1
+        self.position = position
+
+    def literal(self, position):
+        self.group[0] |= 0x80 >> self.tokenCount
+        self.group.append(self.data[position - self.base])
+        self.nextToken()
+
+    def reference(self, length, distance):
+        distance -= 1
+        if length >= 0x12:
+            self.group += bytes((distance >> 8, distance & 0xFF, length - 0x12))
+        else:
+            self.group += bytes(((length - 2) << 4 | distance >> 8, distance & 0xFF))
+        self.nextToken()
+
+    def nextToken(self):
+        self.tokenCount += 1
+        if self.tokenCount == 8:
+            self.output += self.group
+            self.group = bytearray(b"\0")
+            self.tokenCount = 0
+
+
+def compress(data, level=DEFAULT_LEVEL):
+    compressor = Yaz0Compressor(len(data), level)
+    return compressor.compress(data) + compressor.flush()
+
+
+def decompress(data, end=None):  # -> bytes, only the first end bytes if given
+    if not isYaz0(data):
+        raise FormatError("not Yaz0 compressed")
+    size, = struct.unpack_from(">I", data, 4)
+    limit = size if end is None else min(end, size)
+    output = bytearray()
+    source = 16
+    try:
+        while len(output) < limit:
+            code = data[source]
+            source += 1
+            if code == 0xFF and len(output) + 8 <= size:  # eight literals in a row
+                output += data[source:source + 8]
+                source += 8
+                continue
+            for bit in range(8):
+                if len(output) >= limit:
+                    break
+                if code & (0x80 >> bit):
+                    output.append(data[source])
+                    source += 1
+                    continue
+                first, second = data[source], data[source + 1]
+                source += 2
+                distance = ((first & 0x0F) << 8 | second) + 1
+                length = first >> 4
+                if length == 0:
+                    length = data[source] + 0x12
+                    source += 1
+                else:
+                    length += 2
+                start = len(output) - distance
+                if start < 0:
+                    raise FormatError("Yaz0 reference before the start of the data")
+                if distance >= length:
+                    output += output[start:start + length]
+                else:  # the copy overlaps what it writes, repeat the pattern
+                    output += (output[start:]*(length//distance + 1))[:length]
+    except IndexError:
+        raise FormatError("unexpected end of Yaz0 data")
+    if end is not None:  # the last reference may have run past end
+        return bytes(output[:limit])
+    if len(output) != size:
+        raise FormatError("Yaz0 data decompresses past its size")
+    return bytes(output)
+
+
+def compressTo(stream, data, level=DEFAULT_LEVEL, chunkSize=0x10000, progress=None):  # -> compressed size
+    """Yaz0 compress data into a binary stream a chunk at a time.
+
+    progress is called with the number of input bytes done after each chunk,
+    it can raise to stop the compression.
+    """
+    compressor = Yaz0Compressor(len(data), level)
+    view = memoryview(data)
+    written = 0
+    for start in range(0, len(data), chunkSize):
+        output = compressor.compress(view[start:start + chunkSize])
+        stream.write(output)
+        written += len(output)
+        if progress is not None:
+            progress(min(start + chunkSize, len(data)))
+    output = compressor.flush()
+    stream.write(output)
+    return written + len(output)
+
+
+def packYaz0(stream, model, level=DEFAULT_LEVEL, profile=NULL_PROFILE, chunkSize=0x10000):  # pack() with Yaz0 compression
+    data = encode(model, profile)
+    with profile.phase("compress", bytes=len(data)) as phase:
+        phase.count(compressedBytes=compressTo(stream, data, level, chunkSize))
+
+
+def openCOL(filepath):  # binary stream over a COL file, Yaz0 compressed files are decompressed in memory
+    stream = open(filepath, "rb")
+    if stream.read(4) != YAZ0_MAGIC:
+        stream.seek(0)
+        return stream
+    with stream:
+        return io.BytesIO(decompress(YAZ0_MAGIC + stream.read()))